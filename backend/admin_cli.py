@@ -13,6 +13,8 @@ from backend.schemas.genre import GenreDefault
 from backend.schemas.booking import BookingDefault
 from backend.security.authorization import verify_password
 
+SEARCH_LIMIT = 50  # сколько результатов поиска показывать в консоли
+
 
 class AdminCLI:
     def __init__(self):
@@ -927,19 +929,14 @@ class AdminCLI:
         try:
             search_term = input("\nВведите часть названия книги: ").strip()
 
-            books = await self.book_service.get_book()
+            books, next_offset = await self.book_service.search_books(search_term, SEARCH_LIMIT)
             if books:
-                filtered_books = [book for book in books if search_term.lower() in book.title.lower()]
-
-                if filtered_books:
-                    print(f"\nНайдено {len(filtered_books)} книг:")
-                    print("-" * 60)
-                    for book in filtered_books:
-                        print(f"ID: {book.id}, Название: {book.title}, ISBN: {book.isbn or '-'}")
-                else:
-                    print(f"\n📭 Книги по запросу '{search_term}' не найдены")
+                print(f"\nНайдено {len(books)}{'+' if next_offset is not None else ''} книг:")
+                print("-" * 60)
+                for book in books:
+                    print(f"ID: {book.id}, Название: {book.title}, ISBN: {book.isbn or '-'}")
             else:
-                print("\n📭 В базе нет книг")
+                print(f"\n📭 Книги по запросу '{search_term}' не найдены")
 
         except Exception as e:
             print(f"\n❌ Ошибка: {e}")
@@ -974,24 +971,15 @@ class AdminCLI:
         try:
             search_term = input("\nВведите часть имени или фамилии автора: ").strip()
 
-            authors = await self.author_service.get_author()
+            authors, next_offset = await self.author_service.search_authors(search_term, SEARCH_LIMIT)
             if authors:
-                filtered_authors = [
-                    author for author in authors
-                    if search_term.lower() in author.first_name.lower() or
-                       search_term.lower() in author.second_name.lower()
-                ]
-
-                if filtered_authors:
-                    print(f"\nНайдено {len(filtered_authors)} авторов:")
-                    print("-" * 60)
-                    for author in filtered_authors:
-                        print(
-                            f"ID: {author.id}, Имя: {author.first_name} {author.second_name}, Дата рождения: {author.birth_date or '-'}")
-                else:
-                    print(f"\n📭 Авторы по запросу '{search_term}' не найдены")
+                print(f"\nНайдено {len(authors)}{'+' if next_offset is not None else ''} авторов:")
+                print("-" * 60)
+                for author in authors:
+                    print(
+                        f"ID: {author.id}, Имя: {author.first_name} {author.second_name}, Дата рождения: {author.birth_date or '-'}")
             else:
-                print("\n📭 В базе нет авторов")
+                print(f"\n📭 Авторы по запросу '{search_term}' не найдены")
 
         except Exception as e:
             print(f"\n❌ Ошибка: {e}")
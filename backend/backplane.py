@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from backend.cache import caches
+from backend.config import settings
+
+# room_id, тип события, сериализованное сообщение, exclude_user_id
+DeliverHandler = Callable[[int, str, str, Optional[int]], Awaitable[None]]
+
+
+def encode_frame(frame: dict) -> bytes:
+    return json.dumps(frame, separators=(",", ":")).encode() + b"\n"
+
+
+class Backplane(ABC):
+    """Шина между воркерами чата.
+
+    Рассылает события комнат во все процессы и ведет общий список онлайн-подключений,
+    чтобы участники, подключенные к разным воркерам, видели друг друга. Через нее же
+    расходятся сбросы внутрипроцессных кэшей (Cache.invalidate).
+    """
+
+    def __init__(self):
+        self._handler: Optional[DeliverHandler] = None
+        # connection_id -> {"room_id", "user_id", "connected_at"}
+        self.presence: Dict[str, dict] = {}
+
+    def set_handler(self, handler: DeliverHandler):
+        self._handler = handler
+
+    async def _deliver(self, room_id: int, event_type: str, text: str, exclude_user_id: Optional[int]):
+        if self._handler is not None:
+            await self._handler(room_id, event_type, text, exclude_user_id)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def invalidate(self, cache: str, keys: List[str], prefix: Optional[str]):
+        """Сбросить записи кэша в остальных воркерах (в своем процессе они уже удалены)"""
+        pass
+
+    @abstractmethod
+    async def publish(self, room_id: int, event_type: str, text: str, exclude_user_id: Optional[int] = None):
+        ...
+
+    def join(self, connection_id: str, room_id: int, user_id: int, connected_at: str):
+        self.presence[connection_id] = {"room_id": room_id, "user_id": user_id, "connected_at": connected_at}
+
+    def leave(self, connection_id: str):
+        self.presence.pop(connection_id, None)
+
+    def online(self, room_id: int) -> List[dict]:
+        return [
+            {"user_id": entry["user_id"], "connected_at": entry["connected_at"]}
+            for entry in self.presence.values()
+            if entry["room_id"] == room_id
+        ]
+
+
+class InMemoryBackplane(Backplane):
+    """Один процесс: события сразу доставляются локальным подключениям"""
+
+    async def publish(self, room_id: int, event_type: str, text: str, exclude_user_id: Optional[int] = None):
+        await self._deliver(room_id, event_type, text, exclude_user_id)
+
+
+class UnixSocketBackplane(Backplane):
+    """Воркер, подключенный к брокеру (BackplaneBroker) через Unix-сокет.
+
+    Кадры - JSON по строке не длиннее max_frame байт. Публикация уходит брокеру и
+    доставляется локально, когда брокер присылает ее обратно, поэтому порядок событий
+    одинаков во всех воркерах. Пока брокер недоступен, события доставляются только локально,
+    а сбросы кэшей теряются - поэтому после подключения кэши процесса очищаются целиком.
+    """
+
+    def __init__(self, path: str, reconnect_delay: float = 1.0, max_frame: int = settings.CHAT_BACKPLANE_MAX_FRAME):
+        super().__init__()
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self.max_frame = max_frame
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local: Dict[str, dict] = {}  # подключения этого воркера, переотправляются после переподключения
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._reader_task is None:
+            self._reader_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _send(self, frame: dict) -> bool:
+        if self._writer is None or self._writer.is_closing():
+            return False
+        self._writer.write(encode_frame(frame))
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=self.max_frame)
+                self.presence = dict(self._local)
+                self._send({"op": "hello", "worker": self.worker_id})
+                for connection_id, entry in self._local.items():
+                    self._send({"op": "join", "conn": connection_id, **entry})
+                # сбросы, разосланные другими воркерами, пока нас не было, не дошли
+                for cache in caches.values():
+                    await cache.clear()
+
+                while line := await reader.readline():
+                    await self._on_frame(json.loads(line))
+            except asyncio.CancelledError:
+                raise
+            except ValueError as e:
+                # кадр длиннее лимита (LimitOverrunError из readline) или не JSON:
+                # границы кадров в потоке потеряны, переподключаемся
+                print(f"Backplane bad frame, reconnecting: {e}")
+            except Exception as e:
+                print(f"Backplane connection error: {e}")
+            finally:
+                self._writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _on_frame(self, frame: dict):
+        op = frame.get("op")
+        if op == "publish":
+            await self._deliver(frame["room_id"], frame["event_type"], frame["text"], frame.get("exclude"))
+        elif op == "join":
+            super().join(frame["conn"], frame["room_id"], frame["user_id"], frame["connected_at"])
+        elif op == "leave":
+            super().leave(frame["conn"])
+        elif op == "invalidate":
+            cache = caches.get(frame["cache"])
+            if cache is not None:
+                if frame.get("prefix") is not None:
+                    await cache.clear(frame["prefix"])
+                await cache.delete(*frame.get("keys", []))
+
+    async def publish(self, room_id: int, event_type: str, text: str, exclude_user_id: Optional[int] = None):
+        line = encode_frame({"op": "publish", "room_id": room_id, "event_type": event_type, "text": text,
+                             "exclude": exclude_user_id})
+        if len(line) > self.max_frame:
+            # брокер и воркеры не прочитают такой кадр - не отправляем его ни локально, ни в шину
+            raise ValueError(f"Backplane frame too large: {len(line)} > {self.max_frame} bytes")
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            await self._deliver(room_id, event_type, text, exclude_user_id)
+            return
+        writer.write(line)
+        await writer.drain()
+
+    async def invalidate(self, cache: str, keys: List[str], prefix: Optional[str]):
+        self._send({"op": "invalidate", "cache": cache, "keys": keys, "prefix": prefix})
+
+    def join(self, connection_id: str, room_id: int, user_id: int, connected_at: str):
+        entry = {"room_id": room_id, "user_id": user_id, "connected_at": connected_at}
+        self._local[connection_id] = entry
+        super().join(connection_id, **entry)
+        self._send({"op": "join", "conn": connection_id, **entry})
+
+    def leave(self, connection_id: str):
+        self._local.pop(connection_id, None)
+        super().leave(connection_id)
+        self._send({"op": "leave", "conn": connection_id})
+
+
+class BackplaneBroker:
+    """Локальный брокер для UnixSocketBackplane: пересылает публикации и сбросы кэшей
+    всем воркерам и хранит общий список онлайн-подключений.
+
+    Буфер отправки каждому воркеру ограничен max_buffer байт: публикующий ждет, пока
+    отстающий воркер его разберет, а воркер, не читающий дольше drain_timeout, отключается
+    (после переподключения он заново присылает свои подключения).
+    """
+
+    def __init__(self, path: str, max_frame: int = settings.CHAT_BACKPLANE_MAX_FRAME,
+                 max_buffer: int = settings.CHAT_BACKPLANE_MAX_BUFFER,
+                 drain_timeout: float = settings.CHAT_BACKPLANE_DRAIN_TIMEOUT):
+        self.path = path
+        self.max_frame = max_frame
+        self.max_buffer = max_buffer
+        self.drain_timeout = drain_timeout
+        self.workers: Dict[asyncio.StreamWriter, set] = {}  # воркер -> его connection_id
+        self.presence: Dict[str, dict] = {}
+
+    async def _broadcast(self, line: bytes):
+        full = []
+        for writer in list(self.workers):
+            if writer.is_closing():
+                continue
+            writer.write(line)
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                full.append(writer)
+        for writer in full:
+            try:
+                await asyncio.wait_for(writer.drain(), self.drain_timeout)
+            except (asyncio.TimeoutError, ConnectionError):
+                print("Backplane broker: worker is not reading, disconnecting")
+                writer.transport.abort()  # close() ждал бы отправки всего буфера
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.workers[writer] = set()
+        writer.transport.set_write_buffer_limits(high=self.max_buffer)
+        # новый воркер получает текущий список онлайн
+        for connection_id, entry in list(self.presence.items()):
+            writer.write(encode_frame({"op": "join", "conn": connection_id, **entry}))
+
+        try:
+            await writer.drain()
+            while line := await reader.readline():
+                frame = json.loads(line)
+                op = frame.get("op")
+                if op == "join":
+                    self.presence[frame["conn"]] = {
+                        "room_id": frame["room_id"],
+                        "user_id": frame["user_id"],
+                        "connected_at": frame["connected_at"],
+                    }
+                    self.workers[writer].add(frame["conn"])
+                elif op == "leave":
+                    self.presence.pop(frame["conn"], None)
+                    self.workers[writer].discard(frame["conn"])
+                elif op not in ("publish", "invalidate"):
+                    continue
+                await self._broadcast(line)
+        except ConnectionError:
+            pass
+        except ValueError as e:
+            # кадр длиннее max_frame (LimitOverrunError из readline) или не JSON - отключаем воркера
+            print(f"Backplane broker: bad frame from worker, disconnecting: {e}")
+        finally:
+            # воркер отвалился - его подключения больше не онлайн
+            for connection_id in self.workers.pop(writer, set()):
+                self.presence.pop(connection_id, None)
+                await self._broadcast(encode_frame({"op": "leave", "conn": connection_id}))
+            writer.close()
+
+    async def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path, limit=self.max_frame)
+        print(f"Chat backplane broker listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+
+def create_backplane() -> Backplane:
+    if settings.CHAT_BACKPLANE == 'unix':
+        return UnixSocketBackplane(settings.CHAT_BACKPLANE_SOCKET)
+    return InMemoryBackplane()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Брокер событий чата для нескольких воркеров')
+    parser.add_argument('--path', default=settings.CHAT_BACKPLANE_SOCKET)
+    args = parser.parse_args()
+    asyncio.run(BackplaneBroker(args.path).serve_forever())
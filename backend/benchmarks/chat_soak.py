@@ -0,0 +1,521 @@
+"""Нагрузочный прогон чата: тысячи вебсокет-клиентов в комнатах разного размера.
+
+Клиенты с заданной частотой шлют сообщения, typing и отметки о прочтении. Замеряется
+задержка доставки от отправки до получения каждым участником (по размеру комнаты и типу
+события), недоставленные события, оборванные сокеты и память на одно подключение.
+
+inprocess - ConnectionManager в этом же процессе с подставными вебсокетами и без базы:
+            стоимость рассылки и очередей подключений в чистом виде.
+live      - настоящие вебсокеты к uvicorn. Без --url сервер запускается на временной базе
+            SQLite; с --url нужен --database-url базы этого сервера, чтобы создать комнаты.
+
+python -m backend.benchmarks.chat_soak --clients 5000 --room-sizes 2,10,100,1000
+python -m backend.benchmarks.chat_soak --mode live --clients 1000 --duration 30 --output soak.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+
+from backend.benchmarks.load import ROOT, git_revision, load_rows, migrate, percentile, prepare_environment
+
+EVENT_TYPES = ('message', 'typing', 'read')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон вебсокетов чата')
+    parser.add_argument('--mode', choices=('inprocess', 'live'), default='inprocess')
+    parser.add_argument('--clients', type=int, default=2000, help='всего подключений')
+    parser.add_argument('--room-sizes', default='2,10,100',
+                        help='размеры комнат, подключения делятся между ними поровну')
+    parser.add_argument('--duration', type=float, default=20.0, help='секунд отправки событий')
+    parser.add_argument('--drain', type=float, default=2.0, help='секунд ожидания доставки после отправки')
+    parser.add_argument('--message-rate', type=float, default=0.05, help='сообщений в секунду на клиента')
+    parser.add_argument('--typing-rate', type=float, default=0.1, help='событий typing в секунду на клиента')
+    parser.add_argument('--read-rate', type=float, default=0.05, help='отметок о прочтении в секунду на клиента')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    # inprocess
+    parser.add_argument('--queue-size', type=int, help='очередь подключения, по умолчанию WS_SEND_QUEUE_SIZE')
+    parser.add_argument('--policy', choices=('drop', 'coalesce', 'disconnect'),
+                        help='политика медленного клиента, по умолчанию WS_SLOW_CONSUMER_POLICY')
+    parser.add_argument('--slow-fraction', type=float, default=0.0, help='доля медленных клиентов (inprocess)')
+    parser.add_argument('--slow-delay-ms', type=float, default=50.0, help='задержка отправки медленному клиенту')
+    # live
+    parser.add_argument('--url', help='ws://host:port запущенного сервера, без него сервер запускается сам')
+    parser.add_argument('--database-url', help='база сервера; по умолчанию - новая база SQLite')
+    parser.add_argument('--port', type=int, default=8765, help='порт запускаемого сервера')
+    parser.add_argument('--connect-concurrency', type=int, default=100, help='одновременных рукопожатий')
+    parser.add_argument('--no-compression', action='store_true',
+                        help='без permessage-deflate (браузеры его включают, он стоит памяти на подключение)')
+    return parser.parse_args()
+
+
+# ------------------- Rooms -------------------
+
+@dataclass
+class Room:
+    id: int
+    size: int
+    users: list[int]
+    connected: int = 0
+
+
+@dataclass
+class SoakClient:
+    user_id: int
+    room: Room
+    slow: bool = False
+    last_message_id: int | None = None
+    closed: bool = False
+    connection: object = None  # ClientConnection (inprocess) или клиентский вебсокет (live)
+
+
+def plan_rooms(clients: int, sizes: list[int]) -> list[Room]:
+    """Подключения делятся между размерами комнат поровну, каждый пользователь - в одной комнате"""
+    rooms, user = [], 1
+    for size in sizes:
+        for _ in range(max(clients // len(sizes) // size, 1)):
+            rooms.append(Room(len(rooms) + 1, size, list(range(user, user + size))))
+            user += size
+    return rooms
+
+
+def seed_rows(rooms: list[Room]) -> dict[str, list[dict]]:
+    users = [user for room in rooms for user in room.users]
+    return {
+        'users': [{'id': user, 'email': f'soak{user}@example.com', 'username': f'soak{user}',
+                   'password_hash': '!'} for user in users],  # вход по паролю в прогоне не нужен
+        'chatrooms': [{'id': room.id, 'name': f'Комната {room.size}-{room.id}', 'is_group': True} for room in rooms],
+        'chatparticipants': [{'room_id': room.id, 'user_id': user, 'is_admin': i == 0}
+                             for room in rooms for i, user in enumerate(room.users)],
+    }
+
+
+# ------------------- Measurement -------------------
+
+@dataclass
+class Recorder:
+    """Время отправки каждого события и задержки его доставки каждому получателю"""
+    sent_at: dict[tuple, float] = field(default_factory=dict)
+    sent: Counter = field(default_factory=Counter)  # (размер комнаты, тип) -> отправлено событий
+    expected: Counter = field(default_factory=Counter)  # ... -> ожидалось доставок
+    latencies: dict[tuple[int, str], list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: int = 0
+    _last_text: str | None = None
+    _last_frame: dict | None = None
+
+    def parse(self, text: str) -> dict:
+        """Рассылка сериализуется один раз, и все получатели получают тот же объект строки -
+        разбираем его однажды, чтобы разбор не завышал задержку в больших комнатах"""
+        if text is not self._last_text:
+            self._last_text, self._last_frame = text, json.loads(text)
+        return self._last_frame
+
+    def on_send(self, key: tuple, client: SoakClient, event_type: str, recipients: int):
+        self.sent_at[key] = time.perf_counter()
+        self.sent[client.room.size, event_type] += 1
+        self.expected[client.room.size, event_type] += recipients
+
+    def on_frame(self, client: SoakClient, frame: dict):
+        received = time.perf_counter()
+        frame_type = frame.get('type')
+        if frame_type == 'message':
+            message = frame['message']
+            client.last_message_id = message['id']
+            event_type, key = 'message', ('message', message['content'])
+        elif frame_type == 'typing':
+            # typing не несет идентификатора - сопоставляется с последним typing отправителя
+            event_type, key = 'typing', ('typing', frame['user_id'])
+        elif frame_type == 'read_receipt':
+            event_type, key = 'read', ('read', frame['user_id'], frame['message_id'])
+        else:
+            self.errors += frame_type == 'error'
+            return
+        started = self.sent_at.get(key)
+        if started is not None:
+            self.latencies[client.room.size, event_type].append(received - started)
+
+
+class EventSource:
+    """Поток событий клиента: пуассоновские интервалы, тип события - по заданным частотам"""
+
+    def __init__(self, args: argparse.Namespace, recorder: Recorder, send):
+        self.rates = {'message': args.message_rate, 'typing': args.typing_rate, 'read': args.read_rate}
+        self.total_rate = sum(self.rates.values())
+        self.recorder = recorder
+        self.send = send  # async (client, тип события, счетчик) -> None
+        self.sequence = 0
+
+    async def run(self, client: SoakClient, rng: random.Random, until: float):
+        if not self.total_rate:
+            return
+        types = list(self.rates)
+        weights = [self.rates[event_type] for event_type in types]
+        while True:
+            delay = rng.expovariate(self.total_rate)
+            if time.perf_counter() + delay >= until:
+                return
+            await asyncio.sleep(delay)
+            if client.closed:
+                return
+            event_type = rng.choices(types, weights=weights)[0]
+            if event_type == 'read' and client.last_message_id is None:
+                continue
+            self.sequence += 1
+            try:
+                await self.send(client, event_type, self.sequence)
+            except Exception:
+                self.recorder.errors += 1
+
+    def record(self, client: SoakClient, event_type: str, sequence: int) -> tuple[tuple, dict]:
+        """Ключ события для сопоставления с доставкой и кадр, который отправил бы клиент"""
+        room = client.room
+        others = room.connected - (not client.closed)
+        if event_type == 'message':
+            content = f'soak {sequence}'
+            self.recorder.on_send(('message', content), client, event_type, room.connected)
+            return ('message', content), {'type': 'message', 'content': content}
+        if event_type == 'typing':
+            self.recorder.on_send(('typing', client.user_id), client, event_type, others)
+            return ('typing', client.user_id), {'type': 'typing', 'is_typing': True}
+        key = ('read', client.user_id, client.last_message_id)
+        self.recorder.on_send(key, client, event_type, others)
+        return key, {'type': 'read', 'message_id': client.last_message_id}
+
+
+def rss_bytes(pid: int | str = 'self') -> int:
+    """Resident set size процесса по /proc (Linux), 0 - если недоступно"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def raise_file_limit():
+    """Каждое подключение - дескриптор, поднимаем мягкий лимит до жесткого"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+# ------------------- In-process -------------------
+
+class FakeWebSocket:
+    """Вебсокет для ConnectionManager без сети: исходящий кадр сразу разбирается получателем"""
+
+    def __init__(self, client: SoakClient, recorder: Recorder, delay: float):
+        self.client = client
+        self.recorder = recorder
+        self.delay = delay
+        self.close_code: int | None = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.recorder.on_frame(self.client, self.recorder.parse(text))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+        self.client.closed = True
+        self.client.room.connected -= 1
+
+
+async def run_inprocess(args: argparse.Namespace, rooms: list[Room], rng: random.Random) -> dict:
+    from backend.backplane import InMemoryBackplane
+    from backend.controllers.chat import ConnectionManager
+
+    manager = ConnectionManager(InMemoryBackplane())
+    if args.queue_size:
+        manager.max_queue = args.queue_size
+    if args.policy:
+        manager.policy = args.policy
+
+    recorder = Recorder()
+    clients = [SoakClient(user, room, slow=rng.random() < args.slow_fraction) for room in rooms for user in room.users]
+    sockets = [FakeWebSocket(client, recorder, args.slow_delay_ms / 1000 if client.slow else 0) for client in clients]
+
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    for client, websocket in zip(clients, sockets):
+        client.connection = await manager.connect(websocket, client.room.id, client.user_id)
+        client.room.connected += 1
+    traced = tracemalloc.get_traced_memory()[0] - traced_before
+    tracemalloc.stop()
+    rss = rss_bytes() - rss_before
+
+    async def send(client: SoakClient, event_type: str, sequence: int):
+        key, frame = source.record(client, event_type, sequence)
+        if event_type == 'message':
+            # та же рассылка, что делает эндпоинт после записи сообщения в базу
+            now = datetime.now()
+            await manager.broadcast(client.room.id, {
+                'type': 'message',
+                'message': {'id': sequence, 'room_id': client.room.id, 'sender_id': client.user_id,
+                            'content': frame['content'], 'created_at': now.isoformat(), 'is_read': False,
+                            'sender_username': f'soak{client.user_id}'},
+                'timestamp': now.isoformat(),
+            })
+        elif event_type == 'typing':
+            await manager.notify_typing(client.room.id, client.user_id, True)
+        else:
+            await manager.notify_message_read(client.room.id, client.user_id, frame['message_id'])
+
+    source = EventSource(args, recorder, send)
+    max_queue_depth = 0
+
+    async def sample_queues(until: float):
+        nonlocal max_queue_depth
+        while time.perf_counter() < until:
+            depth = max((connection.queue_depth for room in manager.active_connections.values()
+                         for connection in room), default=0)
+            max_queue_depth = max(max_queue_depth, depth)
+            await asyncio.sleep(0.1)
+
+    until = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(sample_queues(until + args.drain),
+                         *[source.run(client, random.Random(rng.random()), until) for client in clients])
+    elapsed = time.perf_counter() - started
+
+    queue_overflows = sum(client.connection.dropped for client in clients)
+    dropped_sockets = sum(websocket.close_code is not None for websocket in sockets)
+    for client in clients:
+        await manager.disconnect(client.connection)
+
+    return {
+        'recorder': recorder,
+        'elapsed': elapsed,
+        'connections': len(clients),
+        'failed_connections': 0,
+        'dropped_sockets': dropped_sockets,
+        'queue_overflows': queue_overflows,
+        'max_queue_depth': max_queue_depth,
+        'memory_per_connection': {'traced_bytes': round(traced / len(clients)), 'rss_bytes': round(rss / len(clients))},
+        'queue_size': manager.max_queue,
+        'policy': manager.policy,
+    }
+
+
+# ------------------- Live server -------------------
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    env = {**os.environ, 'DATABASE_URL': args.database_url, 'IS_DEBUG': '0'}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', str(args.port),
+         '--log-level', 'warning'],
+        cwd=ROOT, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Server exited with code {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', args.port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'Server did not start on port {args.port}')
+
+
+async def run_live(args: argparse.Namespace, rooms: list[Room], rng: random.Random, server_pid: int | None) -> dict:
+    from websockets.asyncio.client import connect
+    from websockets.exceptions import ConnectionClosed
+
+    recorder = Recorder()
+    clients = [SoakClient(user, room) for room in rooms for user in room.users]
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    stopping = False
+    failed_connections = 0
+    dropped_sockets = 0
+    close_codes: Counter = Counter()
+
+    async def read(client: SoakClient):
+        nonlocal dropped_sockets
+        try:
+            async for text in client.connection:
+                recorder.on_frame(client, json.loads(text))
+        except ConnectionClosed:
+            pass
+        if not stopping:
+            dropped_sockets += 1
+            close_codes[client.connection.close_code] += 1
+            client.closed = True
+            client.room.connected -= 1
+
+    async def open_client(client: SoakClient) -> asyncio.Task | None:
+        nonlocal failed_connections
+        async with semaphore:
+            try:
+                client.connection = await connect(f'{args.url}/chat/ws/{client.room.id}?user_id={client.user_id}',
+                                                  open_timeout=30,
+                                                  compression=None if args.no_compression else 'deflate')
+            except Exception:
+                failed_connections += 1
+                client.closed = True
+                return None
+        client.room.connected += 1
+        return asyncio.create_task(read(client))
+
+    async def send(client: SoakClient, event_type: str, sequence: int):
+        _, frame = source.record(client, event_type, sequence)
+        await client.connection.send(json.dumps(frame))
+
+    source = EventSource(args, recorder, send)
+
+    rss_before = rss_bytes(server_pid) if server_pid else 0
+    readers = [task for task in await asyncio.gather(*[open_client(client) for client in clients]) if task]
+    await asyncio.sleep(1)  # сервер проверяет членство и имя пользователя уже после рукопожатия
+    connected = sum(not client.closed for client in clients)
+    rss = rss_bytes(server_pid) - rss_before if server_pid else 0
+
+    until = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(*[source.run(client, random.Random(rng.random()), until)
+                           for client in clients if not client.closed])
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+
+    stopping = True
+    await asyncio.gather(*[client.connection.close() for client in clients if client.connection is not None],
+                         return_exceptions=True)
+    await asyncio.gather(*readers, return_exceptions=True)
+
+    return {
+        'recorder': recorder,
+        'elapsed': elapsed,
+        'connections': connected,
+        'failed_connections': failed_connections,
+        'dropped_sockets': dropped_sockets,
+        'close_codes': {str(code): count for code, count in close_codes.items()},
+        'memory_per_connection': {'server_rss_bytes': round(rss / connected) if connected and server_pid else None},
+    }
+
+
+# ------------------- Report -------------------
+
+def summarize(outcome: dict, rooms: list[Room]) -> dict:
+    recorder: Recorder = outcome.pop('recorder')
+    room_counts = Counter(room.size for room in rooms)
+    by_room_size = {}
+    for size in sorted(room_counts):
+        events = {}
+        for event_type in EVENT_TYPES:
+            values = sorted(recorder.latencies.get((size, event_type), []))
+            expected = recorder.expected[size, event_type]
+            events[event_type] = {
+                'sent': recorder.sent[size, event_type],
+                'expected': expected,
+                'delivered': len(values),
+                'delivery_ratio': round(len(values) / expected, 4) if expected else None,
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+            }
+        by_room_size[size] = {'rooms': room_counts[size], 'clients': room_counts[size] * size, 'events': events}
+
+    delivered = sum(len(values) for values in recorder.latencies.values())
+    return {
+        **outcome,
+        'events_sent': sum(recorder.sent.values()),
+        'deliveries': delivered,
+        'undelivered': sum(recorder.expected.values()) - delivered,
+        'deliveries_per_second': round(delivered / outcome['elapsed'], 1) if outcome['elapsed'] else 0.0,
+        'errors': recorder.errors,
+        'room_sizes': by_room_size,
+    }
+
+
+def print_report(results: dict):
+    header = (f'{"room size":>9}{"rooms":>7}{"event":>9}{"sent":>8}{"delivered":>11}{"ratio":>8}'
+              f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+    print(header)
+    print('-' * len(header))
+    for size, row in results['room_sizes'].items():
+        for event_type, stats in row['events'].items():
+            ratio = '' if stats['delivery_ratio'] is None else stats['delivery_ratio']
+            print(f'{size:>9}{row["rooms"]:>7}{event_type:>9}{stats["sent"]:>8}{stats["delivered"]:>11}{ratio:>8}'
+                  f'{stats["p50_ms"]:>9}{stats["p95_ms"]:>9}{stats["p99_ms"]:>9}{stats["max_ms"]:>9}')
+    print('-' * len(header))
+    print(f'connections: {results["connections"]} (failed {results["failed_connections"]}), '
+          f'dropped sockets: {results["dropped_sockets"]}, undelivered: {results["undelivered"]}, '
+          f'errors: {results["errors"]}')
+    print(f'deliveries: {results["deliveries"]} ({results["deliveries_per_second"]}/s), '
+          f'memory per connection: {results["memory_per_connection"]}')
+    if 'max_queue_depth' in results:
+        print(f'max queue depth: {results["max_queue_depth"]} (limit {results["queue_size"]}, {results["policy"]}), '
+              f'queue overflows: {results["queue_overflows"]}')
+
+
+async def run(args: argparse.Namespace, rooms: list[Room], server_pid: int | None) -> dict:
+    rng = random.Random(args.seed)
+    if args.mode == 'inprocess':
+        return await run_inprocess(args, rooms, rng)
+    return await run_live(args, rooms, rng, server_pid)
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.room_sizes.split(',')]
+    rooms = plan_rooms(args.clients, sizes)
+    raise_file_limit()
+    prepare_environment(args)
+
+    server = None
+    if args.mode == 'live':
+        if args.url and args.database_url is None:
+            raise SystemExit('--url requires --database-url of that server to create the rooms')
+        migrate(reset=False)
+        with tempfile.TemporaryDirectory(prefix='books-soak-seed-') as workdir:
+            asyncio.run(load_rows(seed_rows(rooms), workdir))
+        if not args.url:
+            server = start_server(args)
+            args.url = f'ws://127.0.0.1:{args.port}'
+
+    try:
+        results = summarize(asyncio.run(run(args, rooms, server.pid if server else None)), rooms)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results['meta'] = {
+        **git_revision(),
+        'timestamp': datetime.now(UTC).isoformat(),
+        'mode': args.mode,
+        'clients': args.clients,
+        'room_sizes': sizes,
+        'duration': args.duration,
+        'rates': {'message': args.message_rate, 'typing': args.typing_rate, 'read': args.read_rate},
+    }
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Стоимость ответа-списка книг: ORM + две проверки pydantic против строк БД + одна проверка схемой.
+
+python -m backend.benchmarks.serialization --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend.database.models import Base, Author, Book
+from backend.responses import serialize_rows
+from backend.schemas.book import BookFull
+
+response_adapter = TypeAdapter(list[BookFull])  # так FastAPI проверяет ответ по response_model
+
+
+def serialize_before(books) -> bytes:
+    """Прежний путь: модель на каждую строку, повторная проверка по response_model, dump_json"""
+    models = [BookFull.model_validate(book) for book in books]
+    return response_adapter.dump_json(response_adapter.validate_python(models))
+
+
+def serialize_after(rows) -> bytes:
+    """Новый путь (rows_response): строки колонок, одна проверка схемой и dump_json"""
+    return serialize_rows(rows, BookFull)
+
+
+async def measure(func, repeat: int) -> float:
+    await func()  # прогрев
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def run(rows: int, repeat: int):
+    engine = create_async_engine('sqlite+aiosqlite://')
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(Author), [{'id': 1, 'first_name': 'Лев', 'second_name': 'Толстой'}])
+        await connection.execute(insert(Book), [
+            {'title': f'Книга {i}', 'author': 1, 'publication_year': 1900 + i % 100, 'isbn': f'978-{i}'}
+            for i in range(rows)
+        ])
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def fetch_orm():
+        async with session_factory() as session:
+            return (await session.execute(select(Book).order_by(Book.id))).scalars().all()
+
+    async def fetch_rows():
+        async with session_factory() as session:
+            result = await session.execute(select(*Book.__table__.c).order_by(Book.id))
+            return [dict(row) for row in result.mappings()]
+
+    books, book_rows = await fetch_orm(), await fetch_rows()
+    assert json.loads(serialize_before(books)) == json.loads(serialize_after(book_rows))
+
+    async def before():
+        serialize_before(await fetch_orm())
+
+    async def after():
+        serialize_after(await fetch_rows())
+
+    async def before_serialize_only():
+        serialize_before(books)
+
+    async def after_serialize_only():
+        serialize_after(book_rows)
+
+    print(f'{rows} rows')
+    for name, before_func, after_func in (
+            ('serialize only', before_serialize_only, after_serialize_only),
+            ('fetch + serialize', before, after)):
+        before_ms = await measure(before_func, repeat)
+        after_ms = await measure(after_func, repeat)
+        print(f'{name:>18}: before {before_ms:8.1f} ms, after {after_ms:8.1f} ms ({before_ms / after_ms:.1f}x)')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сравнение сериализации списков до и после rows_response')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
@@ -0,0 +1,155 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from backend.config import settings
+
+
+class CacheBackend(ABC):
+    """Хранилище кэша. Для общего между воркерами кэша достаточно реализовать эти методы"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def clear(self, prefix: str = '') -> None:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Внутрипроцессное хранилище: TTL на запись и LRU-вытеснение при превышении maxsize"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def clear(self, prefix: str = '') -> None:
+        if not prefix:
+            self._data.clear()
+            return
+        for key in [key for key in self._data if key.startswith(prefix)]:
+            del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+# фабрики хранилищ по имени из настроек CACHE_BACKEND, принимают maxsize
+cache_backends: dict[str, Callable[[int], CacheBackend]] = {
+    'memory': MemoryCacheBackend,
+}
+
+
+def register_cache_backend(name: str, factory: Callable[[int], CacheBackend]) -> None:
+    """Зарегистрировать общее хранилище (например, Redis), чтобы выбрать его через CACHE_BACKEND"""
+    cache_backends[name] = factory
+
+
+# рассылка сбросов кэша остальным воркерам: (имя кэша, ключи, префикс); ставит backplane чата
+InvalidationPublisher = Callable[[str, list[str], str | None], Awaitable[None]]
+_invalidation_publisher: InvalidationPublisher | None = None
+
+
+def set_invalidation_publisher(publisher: InvalidationPublisher | None) -> None:
+    """Рассылать сбросы Cache.invalidate* через publisher (None - только в своем процессе)"""
+    global _invalidation_publisher
+    _invalidation_publisher = publisher
+
+
+class Cache:
+    """Именованный кэш поверх хранилища, ключи хранятся с префиксом имени"""
+
+    def __init__(self, name: str, ttl: float, maxsize: int, backend: CacheBackend | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend or cache_backends[settings.CACHE_BACKEND](maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f'{self.name}:{key}'
+
+    async def get(self, key: Hashable) -> Any | None:
+        value = await self.backend.get(self._key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        await self.backend.set(self._key(key), value, self.ttl if ttl is None else ttl)
+
+    async def delete(self, *keys: Hashable) -> None:
+        for key in keys:
+            await self.backend.delete(self._key(key))
+
+    async def clear(self, prefix: str = '') -> None:
+        """Удалить все записи кэша (или только записи, ключ которых начинается с prefix)"""
+        await self.backend.clear(self._key(prefix))
+
+    async def invalidate(self, *keys: Hashable) -> None:
+        """Удалить ключи в этом процессе и в остальных воркерах (их копии в памяти иначе живут до TTL)"""
+        await self.delete(*keys)
+        if _invalidation_publisher is not None:
+            await _invalidation_publisher(self.name, [str(key) for key in keys], None)
+
+    async def invalidate_prefix(self, prefix: str) -> None:
+        """То же, что invalidate, для всех ключей, начинающихся с prefix"""
+        await self.clear(prefix)
+        if _invalidation_publisher is not None:
+            await _invalidation_publisher(self.name, [], prefix)
+
+    def use_backend(self, backend: CacheBackend) -> None:
+        """Подменить хранилище (например, на общее для всех воркеров)"""
+        self.backend = backend
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+caches: dict[str, Cache] = {}
+
+
+def create_cache(name: str, ttl: float, maxsize: int) -> Cache:
+    """Создать кэш и зарегистрировать его для сбора статистики"""
+    cache = Cache(name, ttl, maxsize)
+    caches[name] = cache
+    return cache
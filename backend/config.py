@@ -12,9 +12,48 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    BCRYPT_ROUNDS: int = 12  # при изменении хэши пересчитываются при следующем входе
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_EXECUTOR: str = 'thread'  # thread | process
+
     DATABASE_URL: str = getenv('DATABASE_URL')
     IS_DEBUG: int = getenv('IS_DEBUG')
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # секунды ожидания свободного соединения
+    DB_POOL_RECYCLE: int = 1800  # пересоздавать соединения старше, секунды (-1 - никогда)
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100  # кэш подготовленных запросов драйвера (asyncpg)
+    DB_QUERY_CACHE_SIZE: int = 500  # кэш скомпилированных запросов SQLAlchemy
+    SQL_QUERY_BUDGET: int = 20  # SQL-запросов на HTTP-запрос, сверх - предупреждение в лог (0 - без проверки)
+    SQL_QUERY_BUDGETS: dict[str, int] = {}  # бюджеты маршрутов, JSON: {"GET /books/{book_id}": 2}
+    SQL_REQUEST_LOG: bool = True  # строка лога со статистикой SQL на каждый запрос (в production)
+
+    METRICS_ENABLED: bool = True  # эндпоинт /metrics в формате Prometheus
+    METRICS_REFRESH_SECONDS: float = 5  # обновление снимков состояния воркера при PROMETHEUS_MULTIPROC_DIR
+
+    CACHE_BACKEND: str = getenv('CACHE_BACKEND', 'memory')
+    USER_CACHE_TTL: int = 60  # секунды
+    USER_CACHE_SIZE: int = 10000
+    MEMBERSHIP_CACHE_TTL: int = 300
+    MEMBERSHIP_CACHE_SIZE: int = 100000
+    GENRE_CACHE_TTL: int = 3600  # справочник жанров почти не меняется
+    GENRE_CACHE_SIZE: int = 1000
+    AUTHOR_CACHE_TTL: int = 300
+    AUTHOR_CACHE_SIZE: int = 10000
+
+    WS_SEND_QUEUE_SIZE: int = 256  # сообщений в очереди на одно подключение
+    WS_SLOW_CONSUMER_POLICY: str = 'coalesce'  # drop | coalesce | disconnect
+    CHAT_WRITE_BEHIND: bool = False  # пакетная запись сообщений из вебсокетов
+    CHAT_WRITE_BATCH_SIZE: int = 100
+    CHAT_WRITE_FLUSH_MS: int = 5
+    CHAT_BACKPLANE: str = getenv('CHAT_BACKPLANE', 'memory')  # memory | unix
+    CHAT_BACKPLANE_SOCKET: str = getenv('CHAT_BACKPLANE_SOCKET', '/tmp/books-chat.sock')
+    CHAT_BACKPLANE_MAX_FRAME: int = 1024 * 1024  # байт в одном кадре шины (строка JSON)
+    CHAT_BACKPLANE_MAX_BUFFER: int = 8 * 1024 * 1024  # неотправленных байт брокера на воркер
+    CHAT_BACKPLANE_DRAIN_TIMEOUT: float = 5.0  # сек. ожидания воркера с полным буфером, затем отключение
+
     VERSION: str = "0.0.1"
     DOMAIN: str = "localhost:8000"
 
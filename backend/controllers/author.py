@@ -1,20 +1,34 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Response, Depends, Query
 from fastapi.responses import JSONResponse
 
 from backend.service.author import get_author_service
 from backend.schemas.author import AuthorFull, AuthorDefault
+from backend.responses import conditional_get
 from backend.security.authorization import get_current_user
 
 router = APIRouter(prefix='/authors', tags=['author'])
 
 
-@router.get('', response_model=list[AuthorFull])
+@router.get('', response_model=list[AuthorFull], dependencies=[Depends(conditional_get('authors'))])
 async def get_authors(request: Request):
     service = await get_author_service()
     return await service.get_author()
 
 
-@router.get('/{author_id}', response_model=AuthorFull)
+@router.get('/search', response_model=list[AuthorFull], dependencies=[Depends(conditional_get('authors'))])
+async def search_authors(request: Request, response: Response,
+                         q: str = Query(..., min_length=1, max_length=200),
+                         limit: int = Query(20, ge=1, le=100),
+                         offset: int = Query(0, ge=0)):
+    """Поиск с ранжированием; объявлен до /{author_id}, иначе 'search' разбирался бы как id"""
+    service = await get_author_service()
+    items, next_offset = await service.search_authors(q, limit, offset)
+    if next_offset is not None:
+        response.headers['X-Next-Offset'] = str(next_offset)
+    return items
+
+
+@router.get('/{author_id}', response_model=AuthorFull, dependencies=[Depends(conditional_get('authors'))])
 async def get_author(request: Request, author_id: int):
     service = await get_author_service()
     result = await service.get_author(author_id)
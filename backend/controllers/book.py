@@ -1,20 +1,49 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Response, Depends, Query
 from fastapi.responses import JSONResponse
 
 from backend.service.book import get_book_service
 from backend.schemas.book import BookFull, BookDefault
+from backend.responses import rows_response, conditional_get
 from backend.security.authorization import get_current_user
 
 router = APIRouter(prefix='/books', tags=['book'])
 
 
 @router.get('', response_model=list[BookFull])
-async def get_books(request: Request):
+async def get_books(request: Request,
+                    limit: int = Query(100, ge=1, le=1000),
+                    after: int | None = Query(None, ge=0, description='id последней книги предыдущей страницы'),
+                    author: int | None = None,
+                    genre: int | None = None,
+                    year_from: int | None = None,
+                    year_to: int | None = None,
+                    available_only: bool = False,
+                    cache_headers: dict = Depends(conditional_get('books'))):
     service = await get_book_service()
-    return await service.get_book()
+    books, next_cursor = await service.get_books_page(
+        limit, after, author=author, genre=genre,
+        year_from=year_from, year_to=year_to, available_only=available_only
+    )
+    headers = dict(cache_headers)
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = str(next_cursor)
+    return rows_response(books, BookFull, headers)
 
 
-@router.get('/{book_id}', response_model=BookFull)
+@router.get('/search', response_model=list[BookFull], dependencies=[Depends(conditional_get('books'))])
+async def search_books(request: Request, response: Response,
+                       q: str = Query(..., min_length=1, max_length=200),
+                       limit: int = Query(20, ge=1, le=100),
+                       offset: int = Query(0, ge=0)):
+    """Поиск с ранжированием; объявлен до /{book_id}, иначе 'search' разбирался бы как id"""
+    service = await get_book_service()
+    items, next_offset = await service.search_books(q, limit, offset)
+    if next_offset is not None:
+        response.headers['X-Next-Offset'] = str(next_offset)
+    return items
+
+
+@router.get('/{book_id}', response_model=BookFull, dependencies=[Depends(conditional_get('books'))])
 async def get_book(request: Request, book_id: int):
     service = await get_book_service()
     result = await service.get_book(book_id)
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Request, Depends
 from fastapi.responses import JSONResponse
 
 from backend.service.booking import get_booking_service
-from backend.schemas.booking import BookingFull, BookingDefault
+from backend.schemas.booking import BookingFull, BookingDefault, BookingCheckout, BookingCheckoutResult
+from backend.responses import rows_response
 from backend.security.authorization import get_current_user
 
 router = APIRouter(prefix='/bookings', tags=['booking'])
@@ -13,9 +14,9 @@ async def get_bookings(request: Request, current_user=Depends(get_current_user))
     service = await get_booking_service()
     # Администраторы видят все бронирования, обычные пользователи - только свои
     if hasattr(current_user, 'is_admin') and current_user.is_admin:
-        return await service.get_booking()
+        return rows_response(await service.list_bookings(), BookingFull)
     else:
-        return await service.get_booking(user_id=current_user.id)
+        return rows_response(await service.list_bookings(user_id=current_user.id), BookingFull)
 
 
 @router.get('/{booking_id}', response_model=BookingFull)
@@ -49,6 +50,14 @@ async def create_booking(request: Request, booking: BookingDefault,
         return JSONResponse({"error": str(ae)}, status_code=400)
 
 
+@router.post('/checkout', response_model=BookingCheckoutResult)
+async def checkout_books(request: Request, checkout: BookingCheckout,
+                         current_user=Depends(get_current_user)):
+    """Забронировать несколько книг одной транзакцией, результат - по каждой книге"""
+    service = await get_booking_service()
+    return await service.checkout_books(current_user.id, checkout.book_ids)
+
+
 @router.put('/{booking_id}', response_model=BookingFull)
 async def update_booking(request: Request, booking_id: int, booking: BookingDefault,
                          current_user=Depends(get_current_user)):
@@ -1,64 +1,189 @@
-from typing import List, Optional, Dict, Any
+from collections import deque
+from typing import List, Optional, Dict, Any, Callable, Deque, Hashable
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends, status
 from datetime import datetime
 import asyncio
+import json
+import uuid
 
+from backend.backplane import Backplane, create_backplane
+from backend.cache import set_invalidation_publisher
+from backend.config import settings
 from backend.repository.chat import ChatRepository
+from backend.repository.user import UserRepository
+from backend.responses import rows_response
 from backend.service.chat import get_chat_service, ChatService
+from backend.service.message_writer import message_writer
 from backend.schemas.chat import ChatRoomResponse, ChatMessageResponse, ChatParticipantResponse
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[Dict[str, Any]]] = {}
+class ClientConnection:
+    """Подключение клиента: ограниченная очередь исходящих сообщений и своя задача-писатель.
+
+    Медленный клиент копит очередь только у себя и не задерживает рассылку остальным.
+    При переполнении очереди действует политика WS_SLOW_CONSUMER_POLICY:
+    drop - новое сообщение отбрасывается, coalesce - то же, но неотправленное событие
+    со слотом (typing пользователя) заменяется новым на своем месте и очередь не растет,
+    disconnect - клиент отключается.
+    """
+
+    def __init__(self, websocket: WebSocket, room_id: int, user_id: int,
+                 max_queue: int, policy: str, on_close: Callable[["ClientConnection"], None]):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.room_id = room_id
+        self.user_id = user_id
+        self.connected_at = datetime.now()
+        self.max_queue = max_queue
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+
+        self._on_close = on_close
+        self._pending: Deque[list] = deque()  # [тип события, сериализованное сообщение, слот]
+        self._slots: Dict[Hashable, list] = {}  # слот -> его неотправленный элемент очереди
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+        self._closing: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, event_type: str, text: str, slot: Optional[Hashable] = None) -> bool:
+        """Поставить сообщение в очередь; False - клиент отключен.
+
+        slot - ключ события, которое заменяет предыдущее такое же (typing одного пользователя).
+        """
+        if self.closed:
+            return False
+
+        if self.policy != "coalesce":
+            slot = None
+        if slot is not None:
+            item = self._slots.get(slot)
+            if item is not None:
+                item[1] = text
+                return True
+
+        if len(self._pending) >= self.max_queue:
+            if self.policy == "disconnect":
+                if self._closing is None:
+                    self._closing = asyncio.create_task(self.close(status.WS_1013_TRY_AGAIN_LATER))
+                return False
+            self.dropped += 1
+            return True
+
+        item = [event_type, text, slot]
+        self._pending.append(item)
+        if slot is not None:
+            self._slots[slot] = item
+        self._wakeup.set()
+        return True
+
+    async def _write(self):
+        try:
+            while True:
+                while not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                _, text, slot = self._pending.popleft()
+                if slot is not None:
+                    del self._slots[slot]
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
+        finally:
+            self.closed = True
+            self._on_close(self)
+
+    def stop(self):
+        self.closed = True
+        self._writer.cancel()
 
-    async def connect(self, websocket: WebSocket, room_id: int, user_id: int):
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        self.stop()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """Локальные подключения воркера; рассылка идет через backplane, чтобы дойти
+    и до участников, подключенных к другим воркерам"""
+
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.active_connections: Dict[int, List[ClientConnection]] = {}
+        self.max_queue = settings.WS_SEND_QUEUE_SIZE
+        self.policy = settings.WS_SLOW_CONSUMER_POLICY
+        self.backplane = backplane or create_backplane()
+        self.backplane.set_handler(self._deliver_local)
+        # сбросы кэшей (членство в комнатах) расходятся по воркерам через ту же шину
+        set_invalidation_publisher(self.backplane.invalidate)
+
+    async def connect(self, websocket: WebSocket, room_id: int, user_id: int) -> ClientConnection:
         await websocket.accept()
 
         if room_id not in self.active_connections:
             self.active_connections[room_id] = []
 
-        connection_info = {
-            "websocket": websocket,
-            "user_id": user_id,
-            "connected_at": datetime.now()
-        }
-        self.active_connections[room_id].append(connection_info)
+        connection = ClientConnection(websocket, room_id, user_id, self.max_queue, self.policy, self._remove)
+        self.active_connections[room_id].append(connection)
+        self.backplane.join(connection.id, room_id, user_id, connection.connected_at.isoformat())
+        return connection
+
+    def _remove(self, connection: ClientConnection):
+        connections = self.active_connections.get(connection.room_id)
+        if connections is None or connection not in connections:
+            return
+        connections.remove(connection)
+        self.backplane.leave(connection.id)
+        if not connections:
+            del self.active_connections[connection.room_id]
 
-    async def disconnect(self, websocket: WebSocket, room_id: int, user_id: int):
-        if room_id in self.active_connections:
-            self.active_connections[room_id] = [
-                conn for conn in self.active_connections[room_id]
-                if conn["websocket"] != websocket
-            ]
+    async def disconnect(self, connection: ClientConnection):
+        self._remove(connection)
+        connection.stop()
 
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
+    @staticmethod
+    def serialize(message: Dict[str, Any]) -> str:
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
 
-    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
-        try:
-            await websocket.send_json(message)
-        except Exception:
-            pass
+    async def send_personal_message(self, message: Dict[str, Any], connection: ClientConnection):
+        connection.enqueue(message.get("type", ""), self.serialize(message))
 
     async def broadcast(self, room_id: int, message: Dict[str, Any], exclude_user_id: Optional[int] = None):
+        # Сериализуем один раз на всю рассылку
+        await self.backplane.publish(room_id, message.get("type", ""), self.serialize(message), exclude_user_id)
+
+    async def _deliver_local(self, room_id: int, event_type: str, text: str, exclude_user_id: Optional[int] = None):
         if room_id not in self.active_connections:
             return
 
+        # typing рассылается без автора (exclude_user_id) - у каждого автора свой слот
+        slot = ("typing", exclude_user_id) if event_type == "typing" else None
         disconnected = []
-        for connection in self.active_connections[room_id]:
-            if exclude_user_id and connection["user_id"] == exclude_user_id:
+        for connection in list(self.active_connections[room_id]):
+            if exclude_user_id and connection.user_id == exclude_user_id:
                 continue
 
-            try:
-                await connection["websocket"].send_json(message)
-            except Exception:
+            if not connection.enqueue(event_type, text, slot):
                 disconnected.append(connection)
 
         for connection in disconnected:
-            await self.disconnect(connection["websocket"], room_id, connection["user_id"])
+            self._remove(connection)
+
+    def queue_depths(self) -> Dict[int, int]:
+        """Суммарная длина исходящих очередей по комнатам"""
+        return {
+            room_id: sum(connection.queue_depth for connection in connections)
+            for room_id, connections in self.active_connections.items()
+        }
 
     async def notify_typing(self, room_id: int, user_id: int, is_typing: bool):
         typing_message = {
@@ -112,7 +237,7 @@ async def get_my_chat_rooms(
         chat_service: ChatService = Depends(get_chat_service)
 ):
     """Получить все мои чаты"""
-    return await chat_service.get_user_chats(current_user_id)
+    return rows_response(await chat_service.get_user_chats(current_user_id), ChatRoomResponse)
 
 
 @router.get("/rooms/{room_id}/messages", response_model=List[ChatMessageResponse])
@@ -120,11 +245,14 @@ async def get_chat_messages(
         room_id: int,
         limit: int = 50,
         offset: int = 0,
+        before_id: Optional[int] = None,
+        before_ts: Optional[datetime] = None,
         current_user_id: int = 1,
         chat_service: ChatService = Depends(get_chat_service)
 ):
-    """Получить сообщения чата"""
-    return await chat_service.get_chat_messages(room_id, current_user_id, limit, offset)
+    """Получить сообщения чата (before_id/before_ts - курсор для подгрузки истории)"""
+    messages = await chat_service.get_chat_messages(room_id, current_user_id, limit, offset, before_id, before_ts)
+    return rows_response(messages, ChatMessageResponse)
 
 
 @router.get("/rooms/{room_id}/participants", response_model=List[ChatParticipantResponse])
@@ -134,7 +262,7 @@ async def get_chat_participants(
         chat_service: ChatService = Depends(get_chat_service)
 ):
     """Получить участников чата"""
-    return await chat_service.get_room_participants(room_id, current_user_id)
+    return rows_response(await chat_service.get_room_participants(room_id, current_user_id), ChatParticipantResponse)
 
 
 @router.post("/rooms/{room_id}/participants/{user_id}")
@@ -168,10 +296,14 @@ async def remove_participant(
 @router.get("/unread")
 async def get_unread_count(
         room_id: Optional[int] = None,
+        by_room: bool = False,
         current_user_id: int = 1,
         chat_service: ChatService = Depends(get_chat_service)
 ):
     """Получить количество непрочитанных сообщений"""
+    if by_room:
+        rooms = await chat_service.get_unread_counts_by_room(current_user_id)
+        return {"unread_count": sum(rooms.values()), "rooms": rooms}
     count = await chat_service.get_unread_count(current_user_id, room_id)
     return {"unread_count": count}
 
@@ -184,17 +316,20 @@ async def websocket_endpoint(
 ):
     """Вебсокет эндпоинт для чата"""
 
-    await manager.connect(websocket, room_id, user_id)
+    connection = await manager.connect(websocket, room_id, user_id)
 
     try:
-        # Используем asyncio.create_task для запуска асинхронной операции
-        room_task = asyncio.create_task(ChatRepository.get_chat_room(room_id, user_id))
-        room = await room_task
+        # Членство проверяется один раз при подключении (из кэша, если он уже прогрет)
+        membership = await ChatRepository.get_membership(room_id, user_id)
 
-        if not room:
+        if not membership:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
+        # Имя отправителя берем один раз при подключении, а не на каждое сообщение
+        user = await UserRepository().get_user_by_id(user_id)
+        sender_username = user.username if user else None
+
         # Основной цикл обработки сообщений
         while True:
             try:
@@ -204,34 +339,35 @@ async def websocket_endpoint(
                 if message_type == "message":
                     content = data.get("content", "").strip()
                     if content:
-                        # Создаем задачу для сохранения сообщения
-                        save_task = asyncio.create_task(
-                            ChatRepository.save_message(room_id, user_id, content)
-                        )
-                        message = await save_task
-
-                        # Создаем задачу для получения сообщения с отправителем
-                        get_message_task = asyncio.create_task(
-                            ChatRepository.get_message_with_sender(message.id)
-                        )
-                        message_with_sender = await get_message_task
+                        if settings.CHAT_WRITE_BEHIND:
+                            # Пакетная запись: членство проверяется в транзакции пачки,
+                            # ответ - после ее коммита
+                            message = await message_writer.submit(room_id, user_id, content)
+                        else:
+                            # Один INSERT ... RETURNING - и сразу рассылка
+                            message = await ChatRepository.insert_message(room_id, user_id, content)
+                            if message is None:
+                                raise ValueError("Sender is not a participant in this chat room")
 
                         # Отправляем всем участникам
                         await manager.broadcast(room_id, {
                             "type": "message",
                             "message": {
-                                "id": message_with_sender.id,
-                                "room_id": message_with_sender.room_id,
-                                "sender_id": message_with_sender.sender_id,
-                                "content": message_with_sender.content,
-                                "message_type": message_with_sender.message_type,
-                                "created_at": message_with_sender.created_at.isoformat(),
-                                "is_read": message_with_sender.is_read,
-                                "sender_username": message_with_sender.sender.username if message_with_sender.sender else None
+                                **message,
+                                "created_at": message["created_at"].isoformat(),
+                                "sender_username": sender_username
                             },
                             "timestamp": datetime.now().isoformat()
                         })
 
+                        # Подтверждение отправителю: сообщение записано, client_id связывает его с id
+                        if data.get("client_id") is not None:
+                            await manager.send_personal_message({
+                                "type": "ack",
+                                "client_id": data["client_id"],
+                                "message_id": message["id"]
+                            }, connection)
+
                 elif message_type == "typing":
                     is_typing = data.get("is_typing", False)
                     await manager.notify_typing(room_id, user_id, is_typing)
@@ -249,7 +385,7 @@ async def websocket_endpoint(
                     await manager.send_personal_message({
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
-                    }, websocket)
+                    }, connection)
 
             except WebSocketDisconnect:
                 break
@@ -260,28 +396,17 @@ async def websocket_endpoint(
                         "type": "error",
                         "error": str(e),
                         "timestamp": datetime.now().isoformat()
-                    }, websocket)
+                    }, connection)
                 except:
                     pass
 
     except Exception as e:
         print(f"WebSocket connection error: {e}")
     finally:
-        await manager.disconnect(websocket, room_id, user_id)
+        await manager.disconnect(connection)
 
 
 @router.get("/rooms/{room_id}/online")
 async def get_online_users(room_id: int):
-    """Получить список онлайн пользователей в комнате"""
-    if room_id not in manager.active_connections:
-        return {"online_users": []}
-
-    online_users = [
-        {
-            "user_id": conn["user_id"],
-            "connected_at": conn["connected_at"].isoformat()
-        }
-        for conn in manager.active_connections[room_id]
-    ]
-
-    return {"online_users": online_users}
\ No newline at end of file
+    """Получить список онлайн пользователей в комнате (со всех воркеров)"""
+    return {"online_users": manager.backplane.online(room_id)}
\ No newline at end of file
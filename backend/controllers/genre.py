@@ -4,18 +4,19 @@ from fastapi.responses import JSONResponse
 
 from backend.service.genre import get_genre_service
 from backend.schemas.genre import GenreFull, GenreDefault
+from backend.responses import conditional_get
 from backend.security.authorization import get_current_user
 
 router = APIRouter(prefix='/genres', tags=['genre'])
 
 
-@router.get('', response_model=list[GenreFull])
+@router.get('', response_model=list[GenreFull], dependencies=[Depends(conditional_get('genres'))])
 async def get_genres(request: Request):
     service = await get_genre_service()
     return await service.get_genre()
 
 
-@router.get('/{genre_id}', response_model=GenreFull)
+@router.get('/{genre_id}', response_model=GenreFull, dependencies=[Depends(conditional_get('genres'))])
 async def get_genre(request: Request, genre_id: int):
     service = await get_genre_service()
     result = await service.get_genre(genre_id)
@@ -64,7 +64,7 @@ async def refresh_tokens(
 @router.patch("/me", response_model=UserResponse)
 async def update_user(
         update_data: UserUpdate,
-        current_user: User = Depends(get_current_user),
+        current_user: UserResponse = Depends(get_current_user),
         service: UserService = Depends(get_user_service)
 ):
     try:
@@ -79,7 +79,7 @@ async def update_user(
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
-        current_user: User = Depends(get_current_user),
+        current_user: UserResponse = Depends(get_current_user),
         service: UserService = Depends(get_user_service)
 ):
     try:
@@ -94,7 +94,7 @@ async def delete_user(
 
 
 @router.get("/me", response_model=UserResponse)
-def get_user_data(current_user: User = Depends(get_current_user)):
+def get_user_data(current_user: UserResponse = Depends(get_current_user)):
     return current_user
 
 
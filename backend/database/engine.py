@@ -1,19 +1,130 @@
-from typing import Annotated
+import time
+from contextvars import ContextVar
+from typing import Annotated, Any, Awaitable, Callable
 
 from contextlib import asynccontextmanager
-from sqlalchemy import Text
+from fastapi import HTTPException, status
+from sqlalchemy import Text, event, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncAttrs
 from sqlalchemy.orm import mapped_column, DeclarativeBase, Mapped, declared_attr
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import HTTPConnection
 
 from backend.config import Settings
 
 settings = Settings()
 
-engine = create_async_engine(
-    url=settings.DATABASE_URL,
-    echo=bool(settings.IS_DEBUG),  # логирование SQL-запросов
-    future=True  # использование SQLAlchemy API v.2
-)
+
+class PoolMetrics:
+    """Телеметрия пула соединений: выдачи, возвраты и гистограмма ожидания соединения"""
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(self.WAIT_BUCKETS)
+
+    def observe_wait(self, seconds: float):
+        self.wait_count += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        for i, bound in enumerate(self.WAIT_BUCKETS):
+            if seconds <= bound:
+                self.wait_buckets[i] += 1
+                break
+
+    def snapshot(self, pool) -> dict:
+        stats = {
+            'pool_class': type(pool).__name__,
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+            'invalidations': self.invalidations,
+            'timeouts': self.timeouts,
+            'wait_count': self.wait_count,
+            'wait_avg': self.wait_total / self.wait_count if self.wait_count else 0.0,
+            'wait_max': self.wait_max,
+            'wait_histogram': {str(bound): count for bound, count in zip(self.WAIT_BUCKETS, self.wait_buckets)},
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.update(size=pool.size(), checked_in=pool.checkedin(),
+                         checked_out=pool.checkedout(), overflow=pool.overflow())
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Очередь соединений, замеряющая время ожидания свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.observe_wait(time.perf_counter() - started)
+
+
+def _engine_options(database_url: str) -> dict:
+    options = dict(
+        echo=bool(settings.IS_DEBUG),  # логирование SQL-запросов
+        future=True,  # использование SQLAlchemy API v.2
+        pool_pre_ping=settings.DB_POOL_PRE_PING,  # проверка соединения перед выдачей (после failover БД)
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,  # кэш скомпилированных SQL
+    )
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options  # in-memory SQLite живет в одном соединении, пул не настраивается
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if url.get_driver_name() == 'asyncpg':
+        options['connect_args'] = {'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+engine = create_async_engine(url=settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+
+
+@event.listens_for(engine.sync_engine, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+
+@event.listens_for(engine.sync_engine, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+
+
+@event.listens_for(engine.sync_engine, 'checkin')
+def _on_checkin(dbapi_connection, connection_record):
+    pool_metrics.checkins += 1
+
+
+@event.listens_for(engine.sync_engine, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.invalidations += 1
+
+
+def get_pool_stats() -> dict:
+    """Текущее состояние пула соединений движка"""
+    return pool_metrics.snapshot(engine.pool)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -41,9 +152,126 @@ class Base(AsyncAttrs, DeclarativeBase):
         return cls.__name__.lower() + 's'
 
 
+class UnitOfWork:
+    """Общая сессия и транзакция на запрос"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.failed = False
+        self.after_commit: list[tuple[Callable[..., Awaitable[Any]], tuple]] = []
+        self.table_versions: dict[str, tuple] = {}  # версии таблиц, прочитанные в запросе (ETag, ключи кэша)
+
+    async def commit(self):
+        """Зафиксировать транзакцию и выполнить отложенные до фиксации действия.
+        Соединение возвращается в пул, следующий запрос к БД начнет новую транзакцию"""
+        await self.session.commit()
+        callbacks, self.after_commit = self.after_commit, []
+        for func, args in callbacks:
+            try:
+                await func(*args)
+            except Exception as e:
+                print(f"After-commit callback error: {e}")
+
+
+_unit_of_work: ContextVar[UnitOfWork | None] = ContextVar('unit_of_work', default=None)
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """Одна сессия и одна транзакция на весь блок: все репозитории внутри работают через нее.
+    Если в каком-либо репозитории произошла ошибка - откатывается вся единица работы"""
+    current = _unit_of_work.get()
+    if current is not None:  # вложенный вызов - используем внешнюю единицу работы
+        yield current.session
+        return
+
+    session = AsyncSessionLocal()
+    uow = UnitOfWork(session)
+    token = _unit_of_work.set(uow)
+    try:
+        yield session
+        if uow.failed:
+            await session.rollback()
+        else:
+            await uow.commit()
+    except Exception as e:
+        await session.rollback()
+        raise e
+    finally:
+        try:
+            _unit_of_work.reset(token)
+        except ValueError:  # выход из другого контекста (зависимость FastAPI)
+            _unit_of_work.set(None)
+        await session.close()
+
+
+async def get_request_session(connection: HTTPConnection):
+    """Зависимость FastAPI: единица работы на HTTP-запрос (вебсокеты работают без нее).
+
+    Подключается с scope="function": фиксация и действия after_commit выполняются до отправки
+    ответа, поэтому клиент не получит 2xx на незафиксированную запись. Ошибка фиксации - 500.
+    """
+    if connection.scope['type'] != 'http':
+        yield None
+        return
+    committing = False
+    try:
+        async with unit_of_work() as session:
+            yield session
+            committing = True  # обработчик завершился, выход из блока - фиксация
+    except Exception as e:
+        if not committing:
+            raise e
+        print(f"Request commit error: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to save changes") from e
+
+
+def get_unit_of_work() -> UnitOfWork | None:
+    return _unit_of_work.get()
+
+
+async def after_commit(func: Callable[..., Awaitable[Any]], *args):
+    """Выполнить действие (например, сброс кэша) после фиксации транзакции запроса.
+
+    До фиксации параллельный запрос прочитал бы из БД еще старые данные и снова положил
+    их в кэш. Без единицы работы сессия фиксируется на выходе из get_async_session,
+    поэтому действие, вызванное после блока, выполняется сразу. При откате не выполняется.
+    """
+    uow = _unit_of_work.get()
+    if uow is None:
+        await func(*args)
+    else:
+        uow.after_commit.append((func, args))
+
+
+async def release_connection():
+    """Зафиксировать сделанное запросом и вернуть соединение в пул перед долгим ожиданием
+    без БД (bcrypt), чтобы оно не держалось занятым все это время"""
+    uow = _unit_of_work.get()
+    if uow is not None and not uow.failed:
+        await uow.commit()
+
+
 @asynccontextmanager
 async def get_async_session(commit=True):
-    """Асинхронный контекстный менеджер для сессий БД, использовать с async with"""
+    """Асинхронный контекстный менеджер для сессий БД, использовать с async with.
+
+    Внутри unit_of_work() отдает общую сессию запроса (фиксация - в конце запроса),
+    иначе открывает отдельную сессию, как в админ-консоли и загрузке фикстур.
+    """
+    uow = _unit_of_work.get()
+    if uow is not None:
+        try:
+            yield uow.session
+            if commit:
+                await uow.session.flush()  # изменения видны следующим репозиториям запроса
+                uow.table_versions.clear()  # триггеры могли увеличить версии
+        except Exception as e:
+            uow.failed = True
+            raise e
+        return
+
     session = AsyncSessionLocal()
     try:  # автоматическая работа с БД
         yield session  # <- здесь выполняется код тела async with
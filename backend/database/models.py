@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, DateTime, func, Text
+from sqlalchemy import ForeignKey, DateTime, func, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 
@@ -8,7 +8,7 @@ from backend.database.engine import Base, uniq_str
 class User(Base):
     username: Mapped[str | None]
     password_hash: Mapped[str]
-    email: Mapped[str]
+    email: Mapped[str] = mapped_column(unique=True, index=True)
 
     def __str__(self):
         return self.username if self.username else self.email
@@ -16,12 +16,12 @@ class User(Base):
 
 class Book(Base):
     title: Mapped[str]
-    author: Mapped[int] = mapped_column(ForeignKey('authors.id'))
+    author: Mapped[int] = mapped_column(ForeignKey('authors.id'), index=True)
     publication_year: Mapped[int | None]
-    genre: Mapped[int | None] = mapped_column(ForeignKey('genres.id'))
+    genre: Mapped[int | None] = mapped_column(ForeignKey('genres.id'), index=True)
     isbn: Mapped[str | None]  # международный стандартный номер книги
     page_count: Mapped[int | None]
-    reserved_by: Mapped[int | None] = mapped_column(ForeignKey('users.id'))
+    reserved_by: Mapped[int | None] = mapped_column(ForeignKey('users.id'), index=True)
 
     def __str__(self):
         return f'{self.title} - {self.isbn if self.isbn else 'NO ISBN'}'
@@ -44,9 +44,17 @@ class Genre(Base):
         return f'{self.name}'
 
 
+class TableVersion(Base):
+    """Счетчик изменений таблицы каталога, его увеличивают триггеры (миграция table_versions).
+    По нему строятся ETag, ответ 304 не требует чтения самих строк"""
+    table_name: Mapped[uniq_str]
+    version: Mapped[int] = mapped_column(default=0, server_default='0')
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class Booking(Base):
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
-    book_id: Mapped[int] = mapped_column(ForeignKey('books.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), index=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey('books.id'), index=True)
 
     take_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now())
     end_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), default=None)
@@ -70,10 +78,16 @@ class ChatRoom(Base):
 
 class ChatParticipant(Base):
     """Участник чата"""
+    __table_args__ = (
+        Index('uq_chatparticipants_room_id_user_id', 'room_id', 'user_id', unique=True),  # одно членство на комнату
+    )
+
     room_id: Mapped[int] = mapped_column(ForeignKey('chatrooms.id', ondelete="CASCADE"))
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), index=True)
     joined_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now())
     is_admin: Mapped[bool] = mapped_column(default=False)
+    unread_count: Mapped[int] = mapped_column(default=0, server_default='0')  # денормализованный счетчик непрочитанных
+    last_read_message_id: Mapped[int | None]  # курсор прочтения: id последнего прочитанного сообщения
 
     # Отношения
     room = relationship("ChatRoom", back_populates="participants", lazy="selectin")
@@ -85,6 +99,10 @@ class ChatParticipant(Base):
 
 class ChatMessage(Base):
     """Сообщение в чате"""
+    __table_args__ = (
+        Index('ix_chatmessages_room_id_created_at_id', 'room_id', 'created_at', 'id'),  # история комнаты по курсору
+    )
+
     room_id: Mapped[int] = mapped_column(ForeignKey('chatrooms.id', ondelete="CASCADE"))
     sender_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"))
     content: Mapped[str] = mapped_column(Text)
@@ -1,48 +1,299 @@
+import argparse
 import asyncio
 import json
 import os
 import sys
+import time
+from datetime import date, datetime
+from typing import Iterator
 
 # для успешного импорта библиотек при запуске из терминала
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from backend.repository.genre import GenreRepository
+from sqlalchemy import Table, func, or_, select, text, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection
 
+from backend.database.engine import engine
+from backend.database.models import Base
 
-async def write_fixture(data: dict, repo_func):
-    res = await repo_func(**data)
-    return res
+FIXTURE_EXTENSIONS = ('.json', '.ndjson', '.jsonl')
 
 
-async def find_fixtures_path_n_files():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    fixtures_directory = script_dir
-    fix_files = [file for file in os.listdir(fixtures_directory)
-                 if file.endswith('.json')]
+def iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """Потоковое чтение JSON-массива объектов: в памяти только текущий кусок файла"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise AttributeError(f"{f.name} not in right fixture format. List must be in.")
+    buffer = buffer[1:]
+    eof = False
 
-    return fixtures_directory, fix_files
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
 
 
-async def run():
-    known_repo_for_fixture = {
-        'genres.json': GenreRepository().create_genre,
-    }
+def iter_fixture(path: str) -> Iterator[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            yield from iter_json_array(f)
+        else:  # NDJSON: один объект на строку
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
 
-    fixtures_directory, fix_files = await find_fixtures_path_n_files()
-    for file in fix_files:
-        print(file)
-        with open(os.path.join(fixtures_directory, file), 'r') as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                for line in data:
-                    try:
-                        await write_fixture(line, known_repo_for_fixture[file])
-                        print(line.items())
-                    except ValueError as e:
-                        print(f'{e}. INFO: {file} - {line.items()}')
-            else:
-                raise AttributeError(f"{file} not in right fixture format. List must be in.")
+
+class RowConverter:
+    """Приводит объект фикстуры к строке таблицы: лишние ключи отбрасываются,
+    даты из ISO-строк разбираются, открытый пароль пользователя хешируется"""
+
+    def __init__(self, table: Table):
+        self.table = table
+        self.columns = set(table.c.keys())
+        self.datetime_columns = set()
+        self.date_columns = set()
+        for column in table.c:
+            try:
+                python_type = column.type.python_type
+            except NotImplementedError:
+                continue
+            if python_type is datetime:
+                self.datetime_columns.add(column.key)
+            elif python_type is date:
+                self.date_columns.add(column.key)
+
+    def __call__(self, item: dict) -> dict:
+        if self.table.name == 'users' and 'password' in item and 'password_hash' not in item:
+            from backend.security.authorization import get_password_hash
+            item['password_hash'] = get_password_hash(item['password'])
+
+        row = {key: value for key, value in item.items() if key in self.columns}
+        for key in self.datetime_columns & row.keys():
+            if isinstance(row[key], str):
+                row[key] = datetime.fromisoformat(row[key])
+        for key in self.date_columns & row.keys():
+            if isinstance(row[key], str):
+                row[key] = date.fromisoformat(row[key])
+        return row
+
+
+def upsert_statement(table: Table, dialect: str, on_conflict: str):
+    """INSERT ... ON CONFLICT: 'nothing' пропускает дубликаты по любому уникальному ключу,
+    'update' перезаписывает строку с тем же id"""
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(table)
+    if on_conflict == 'update':
+        primary_key = [column.name for column in table.primary_key]
+        return stmt.on_conflict_do_update(
+            index_elements=primary_key,
+            set_={column.name: stmt.excluded[column.name]
+                  for column in table.c if column.name not in primary_key}
+        )
+    return stmt.on_conflict_do_nothing()
+
+
+async def write_batch(connection: AsyncConnection, table: Table, rows: list[dict],
+                      on_conflict: str, use_copy: bool, commit: bool = True):
+    # executemany требует одинаковый набор ключей - группируем строки по нему
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    for columns, group in groups.items():
+        if use_copy:
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                table.name, columns=list(columns), records=[tuple(row[c] for c in columns) for row in group]
+            )
+        else:
+            await connection.execute(upsert_statement(table, engine.dialect.name, on_conflict), group)
+    if commit:
+        await connection.commit()
+
+
+async def sync_sequence(connection: AsyncConnection, table: Table):
+    """PostgreSQL: после вставки явных id сдвигаем последовательность за максимальный id"""
+    await connection.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"coalesce((SELECT max(id) FROM {table.name}), 0) + 1, false)"
+    ))
+    await connection.commit()
+
+
+class SuspendedTriggers:
+    """SQLite: на время загрузки снимает построчные триггеры таблицы (полнотекстовый индекс
+    и счетчик версий для ETag), а в конце перестраивает индекс одним 'rebuild' и увеличивает
+    версию один раз - это в разы быстрее, чем триггер на каждую строку.
+
+    Снятие триггеров, загрузка и их восстановление - одна транзакция (DDL в SQLite
+    транзакционен): при ошибке или падении процесса откат возвращает триггеры вместе
+    с таблицей. Пока триггеры сняты, пачки не фиксируются по отдельности.
+    """
+
+    def __init__(self, connection: AsyncConnection, table: Table):
+        self.connection = connection
+        self.table = table
+        self.triggers: list[tuple[str, str]] = []
+
+    async def __aenter__(self):
+        if engine.dialect.name != 'sqlite':
+            return self
+        # pysqlite не открывает транзакцию перед DDL сам - открываем явно
+        await self.connection.exec_driver_sql('BEGIN IMMEDIATE')
+        result = await self.connection.execute(
+            text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = :table "
+                 "AND (name LIKE '%\\_fts\\_%' ESCAPE '\\' OR name LIKE '%\\_version\\_%' ESCAPE '\\')"),
+            {'table': self.table.name}
+        )
+        self.triggers = [tuple(row) for row in result]
+        for name, _ in self.triggers:
+            await self.connection.execute(text(f'DROP TRIGGER {name}'))
+        if not self.triggers:
+            await self.connection.commit()
+        return self
+
+    async def __aexit__(self, exc_type, *exc_info):
+        if not self.triggers:
+            return
+        if exc_type is not None:
+            await self.connection.rollback()  # вместе с загруженными строками вернутся и триггеры
+            return
+        for _, sql in self.triggers:
+            await self.connection.execute(text(sql))
+        for fts in {name.rsplit('_', 1)[0] for name, _ in self.triggers if '_fts_' in name}:
+            await self.connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        if any('_version_' in name for name, _ in self.triggers):
+            await self.connection.execute(
+                text("UPDATE tableversions SET version = version + 1, updated_at = CURRENT_TIMESTAMP "
+                     "WHERE table_name = :table"),
+                {'table': self.table.name}
+            )
+        await self.connection.commit()
+
+
+async def refresh_chat_read_state(connection: AsyncConnection):
+    """Курсор прочтения и счетчик непрочитанных участников ведет репозиторий чата;
+    после загрузки сообщений или участников в обход него пересчитываем их по сообщениям"""
+    participants = Base.metadata.tables['chatparticipants']
+    messages = Base.metadata.tables['chatmessages']
+    in_room = messages.c.room_id == participants.c.room_id
+
+    # курсор - последнее сообщение, прочитанное или отправленное участником; назад не сдвигается
+    last_read = (
+        select(func.max(messages.c.id))
+        .where(
+            in_room,
+            or_(messages.c.is_read == true(),
+                messages.c.sender_id == participants.c.user_id,
+                messages.c.id <= participants.c.last_read_message_id)
+        )
+        .scalar_subquery()
+    )
+    await connection.execute(participants.update().values(last_read_message_id=last_read))
+
+    unread = (
+        select(func.count())
+        .where(
+            in_room,
+            messages.c.sender_id != participants.c.user_id,
+            messages.c.id > func.coalesce(participants.c.last_read_message_id, 0)
+        )
+        .scalar_subquery()
+    )
+    await connection.execute(participants.update().values(unread_count=unread))
+    await connection.commit()
+
+
+async def load_file(path: str, table: Table, batch_size: int, on_conflict: str, use_copy: bool) -> int:
+    convert = RowConverter(table)
+    started = time.perf_counter()
+    count = 0
+
+    async with engine.connect() as connection:
+        async with SuspendedTriggers(connection, table) as suspended:
+            commit = not suspended.triggers  # иначе фиксирует SuspendedTriggers в конце
+            batch = []
+            for item in iter_fixture(path):
+                batch.append(convert(item))
+                if len(batch) >= batch_size:
+                    await write_batch(connection, table, batch, on_conflict, use_copy, commit)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                await write_batch(connection, table, batch, on_conflict, use_copy, commit)
+                count += len(batch)
+
+        if engine.dialect.name == 'postgresql':
+            await sync_sequence(connection, table)
+        if table.name in ('chatmessages', 'chatparticipants'):
+            await refresh_chat_read_state(connection)
+
+    elapsed = time.perf_counter() - started
+    print(f'{os.path.basename(path)} -> {table.name}: {count} rows in {elapsed:.2f}s '
+          f'({count / elapsed if elapsed else 0:.0f} rows/s)')
+    return count
+
+
+def find_fixture_files(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, file) for file in sorted(os.listdir(path))
+                         if file.endswith(FIXTURE_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def table_for_file(path: str) -> Table:
+    """Таблица определяется по имени файла: books.json, books.ndjson, books.part1.jsonl -> books"""
+    name = os.path.basename(path).split('.')[0]
+    table = Base.metadata.tables.get(name)
+    if table is None:
+        raise AttributeError(f'{path}: unknown table {name!r}, expected one of {", ".join(Base.metadata.tables)}')
+    return table
+
+
+async def run(paths: list[str], batch_size: int, on_conflict: str, use_copy: bool):
+    if use_copy and engine.dialect.name != 'postgresql':
+        raise AttributeError('COPY is available only for PostgreSQL')
+
+    # файлы грузим в порядке зависимостей таблиц по внешним ключам
+    order = {table.name: i for i, table in enumerate(Base.metadata.sorted_tables)}
+    files = sorted(find_fixture_files(paths), key=lambda file: order[table_for_file(file).name])
+
+    started = time.perf_counter()
+    total = 0
+    for file in files:
+        total += await load_file(file, table_for_file(file), batch_size, on_conflict, use_copy)
+    elapsed = time.perf_counter() - started
+    print(f'Total: {total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s)')
+    await engine.dispose()
 
 
 if __name__ == '__main__':
-    asyncio.run(run())
+    parser = argparse.ArgumentParser(description='Загрузка фикстур (JSON-массив или NDJSON, файл на таблицу)')
+    parser.add_argument('paths', nargs='*', default=[os.path.dirname(os.path.abspath(__file__))],
+                        help='файлы или каталоги с фикстурами, по умолчанию - каталог fixtures')
+    parser.add_argument('--batch-size', type=int, default=5000, help='строк в одной пачке INSERT')
+    parser.add_argument('--on-conflict', choices=('nothing', 'update'), default='nothing',
+                        help='nothing - пропускать существующие строки, update - перезаписывать по id')
+    parser.add_argument('--copy', action='store_true',
+                        help='PostgreSQL: COPY вместо INSERT (без обработки конфликтов)')
+    args = parser.parse_args()
+    asyncio.run(run(args.paths, args.batch_size, args.on_conflict, args.copy))
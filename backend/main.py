@@ -1,20 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, UTC
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.requests import Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.config import Settings
+from backend.database.engine import get_request_session
 from backend.controllers.user import router as user_router
 from backend.controllers.genre import router as genre_router
 from backend.controllers.book import router as book_router
 from backend.controllers.booking import router as booking_router
 from backend.controllers.author import router as author_router
-from backend.controllers.chat import router as chat_router  # Добавлено
+from backend.controllers.chat import router as chat_router, manager as chat_manager  # Добавлено
+from backend.metrics import MULTIPROCESS, MetricsMiddleware, mark_process_dead, metrics_endpoint, run_collector
+from backend.query_stats import QueryStatsMiddleware
+from backend.security.authorization import password_hasher
+from backend.service.message_writer import message_writer
 
 settings = Settings()
 
-app = FastAPI(title="Books API", version=settings.VERSION)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await chat_manager.backplane.start()
+    # несколько воркеров: каждый сам записывает снимки своего состояния в общие файлы метрик
+    collector = asyncio.create_task(run_collector()) if settings.METRICS_ENABLED and MULTIPROCESS else None
+    yield
+    if collector is not None:
+        collector.cancel()
+    await message_writer.stop()
+    await chat_manager.backplane.stop()
+    password_hasher.shutdown()
+    mark_process_dead()
+
+
+app = FastAPI(title="Books API", version=settings.VERSION, lifespan=lifespan,
+              dependencies=[Depends(get_request_session, scope="function")])  # одна сессия БД на запрос
 app.include_router(user_router)
 app.include_router(genre_router)
 app.include_router(book_router)
@@ -22,15 +45,20 @@ app.include_router(booking_router)
 app.include_router(author_router)
 app.include_router(chat_router)
 
+if settings.METRICS_ENABLED:
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.add_middleware(MetricsMiddleware)  # внутри QueryStatsMiddleware: видит число SQL-запросов
+app.add_middleware(QueryStatsMiddleware)  # учет SQL-запросов; CORS снаружи, preflight не учитывается
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag", "Server-Timing"],
 )
 
 
 @app.get("/")
 async def main(request: Request):
-    return {"message": f"Server on line. Time (UTC): {datetime.now(UTC)}"}
\ No newline at end of file
+    return {"message": f"Server on line. Time (UTC): {datetime.now(UTC)}"}
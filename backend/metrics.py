@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.cache import caches
+from backend.config import settings
+from backend.database.engine import get_pool_stats
+from backend.query_stats import get_query_stats, route_path
+
+# Несколько воркеров uvicorn: значения пишутся в файлы каталога PROMETHEUS_MULTIPROC_DIR
+# (переменная окружения prometheus_client, каталог очищается перед запуском сервера)
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+# ------------------- HTTP -------------------
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP-запроса', ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+http_request_queries = Histogram(
+    'http_request_db_queries', 'SQL-запросов на HTTP-запрос', ['method', 'route'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+http_requests_in_progress = Gauge(
+    'http_requests_in_progress', 'HTTP-запросы в обработке', ['method'], multiprocess_mode='livesum',
+)
+
+# ------------------- Снимки состояния процесса -------------------
+
+db_pool_size = Gauge('db_pool_size', 'Размер пула соединений', multiprocess_mode='livesum')
+db_pool_checked_out = Gauge('db_pool_checked_out', 'Выданные соединения', multiprocess_mode='livesum')
+db_pool_overflow = Gauge('db_pool_overflow', 'Соединения сверх размера пула', multiprocess_mode='livesum')
+db_pool_connects = Counter('db_pool_connects', 'Новые соединения с БД')
+db_pool_checkouts = Counter('db_pool_checkouts', 'Выдачи соединений из пула')
+db_pool_timeouts = Counter('db_pool_timeouts', 'Таймауты ожидания соединения')
+db_pool_invalidations = Counter('db_pool_invalidations', 'Инвалидированные соединения')
+db_pool_wait_seconds = Counter('db_pool_wait_seconds', 'Суммарное ожидание свободного соединения')
+db_pool_wait_max = Gauge('db_pool_wait_max_seconds', 'Максимальное ожидание соединения', multiprocess_mode='livemax')
+
+ws_connections = Gauge('ws_connections', 'Активные вебсокет-подключения', multiprocess_mode='livesum')
+ws_rooms = Gauge('ws_rooms', 'Комнаты с подключениями (по воркерам)', multiprocess_mode='livesum')
+ws_queue_depth = Gauge('ws_send_queue_depth', 'Сообщения в исходящих очередях подключений',
+                       multiprocess_mode='livesum')
+ws_queue_depth_max = Gauge('ws_send_queue_depth_max', 'Наибольшая суммарная очередь одной комнаты',
+                           multiprocess_mode='livemax')
+
+password_hash_waiting = Gauge('password_hash_waiting', 'bcrypt: ожидают свободного потока',
+                              multiprocess_mode='livesum')
+password_hash_in_flight = Gauge('password_hash_in_flight', 'bcrypt: вычисляются', multiprocess_mode='livesum')
+password_hash_completed = Counter('password_hash_completed', 'bcrypt: выполнено')
+password_hash_queue_seconds = Counter('password_hash_queue_seconds', 'bcrypt: суммарное время в очереди')
+password_hash_queue_max = Gauge('password_hash_queue_max_seconds', 'bcrypt: максимальное время в очереди',
+                                multiprocess_mode='livemax')
+
+cache_hits = Counter('cache_hits', 'Попадания в кэш', ['cache'])
+cache_misses = Counter('cache_misses', 'Промахи кэша', ['cache'])
+cache_hit_ratio = Gauge('cache_hit_ratio', 'Доля попаданий в кэш', ['cache'], multiprocess_mode='liveall')
+
+chat_writer_queue_depth = Gauge('chat_writer_queue_depth', 'Сообщения в очереди пакетной записи',
+                                multiprocess_mode='livesum')
+chat_writer_batches = Counter('chat_writer_batches', 'Записанные пачки сообщений')
+chat_writer_messages = Counter('chat_writer_messages', 'Сообщения, записанные пачками')
+chat_writer_failed = Counter('chat_writer_failed', 'Сообщения, не записанные из-за ошибки')
+
+
+class CounterSync:
+    """Переносит накопительный счетчик из статистики компонента в Counter приращениями -
+    так значения суммируются между воркерами и переживают их перезапуск"""
+
+    def __init__(self):
+        self._last: dict[tuple[Counter, tuple[str, ...]], float] = {}
+
+    def update(self, counter: Counter, value: float, *labels: str):
+        key = (counter, labels)
+        delta = value - self._last.get(key, 0)
+        self._last[key] = value
+        if delta > 0:
+            (counter.labels(*labels) if labels else counter).inc(delta)
+
+
+_counters = CounterSync()
+
+
+def collect_process_stats():
+    """Снять статистику компонентов процесса (пул, вебсокеты, bcrypt, кэши, запись чата)"""
+    from backend.controllers.chat import manager
+    from backend.security.authorization import password_hasher
+    from backend.service.message_writer import message_writer
+
+    pool = get_pool_stats()
+    if 'size' in pool:
+        db_pool_size.set(pool['size'])
+        db_pool_checked_out.set(pool['checked_out'])
+        db_pool_overflow.set(max(pool['overflow'], 0))
+    _counters.update(db_pool_connects, pool['connects'])
+    _counters.update(db_pool_checkouts, pool['checkouts'])
+    _counters.update(db_pool_timeouts, pool['timeouts'])
+    _counters.update(db_pool_invalidations, pool['invalidations'])
+    _counters.update(db_pool_wait_seconds, pool['wait_avg'] * pool['wait_count'])
+    db_pool_wait_max.set(pool['wait_max'])
+
+    depths = manager.queue_depths()
+    ws_connections.set(sum(len(connections) for connections in manager.active_connections.values()))
+    ws_rooms.set(len(manager.active_connections))
+    ws_queue_depth.set(sum(depths.values()))
+    ws_queue_depth_max.set(max(depths.values(), default=0))
+
+    hasher = password_hasher.stats()
+    password_hash_waiting.set(hasher['waiting'])
+    password_hash_in_flight.set(hasher['in_flight'])
+    _counters.update(password_hash_completed, hasher['completed'])
+    _counters.update(password_hash_queue_seconds, hasher['queue_time_avg'] * hasher['completed'])
+    password_hash_queue_max.set(hasher['queue_time_max'])
+
+    for cache in caches.values():
+        stats = cache.stats()
+        _counters.update(cache_hits, stats['hits'], cache.name)
+        _counters.update(cache_misses, stats['misses'], cache.name)
+        cache_hit_ratio.labels(cache.name).set(stats['hit_ratio'])
+
+    writer = message_writer.stats()
+    chat_writer_queue_depth.set(writer['queue_depth'])
+    _counters.update(chat_writer_batches, writer['batches'])
+    _counters.update(chat_writer_messages, writer['messages'])
+    _counters.update(chat_writer_failed, writer['failed'])
+
+
+async def run_collector():
+    """Фоновое обновление снимков: /metrics отвечает один воркер, остальные должны
+    записывать свои значения сами"""
+    while True:
+        collect_process_stats()
+        await asyncio.sleep(settings.METRICS_REFRESH_SECONDS)
+
+
+def mark_process_dead():
+    """При остановке воркера убрать его live-значения из общих файлов"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+async def metrics_endpoint() -> Response:
+    """Метрики в формате Prometheus. Выполняется в event loop: снимки читают его объекты"""
+    collect_process_stats()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Длительность, число SQL-запросов и запросы в обработке по маршрутам.
+
+    Подключается внутрь QueryStatsMiddleware, чтобы видеть статистику SQL запроса.
+    Метка route - шаблон пути, запросы мимо маршрутов собираются под одной меткой.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = route_path(scope) or '<unmatched>'
+            http_request_duration.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+            stats = get_query_stats()
+            if stats is not None:
+                http_request_queries.labels(method, route).observe(stats.count)
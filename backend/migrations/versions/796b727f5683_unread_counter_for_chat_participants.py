@@ -0,0 +1,50 @@
+"""unread counter for chat participants
+
+Revision ID: 796b727f5683
+Revises: aaea36271340
+Create Date: 2026-10-18 09:12:41.503217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '796b727f5683'
+down_revision: Union[str, Sequence[str], None] = 'aaea36271340'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chatparticipants',
+                  sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    # заполняем счетчики по уже существующим сообщениям
+    participants = sa.table('chatparticipants',
+                            sa.column('room_id', sa.Integer()),
+                            sa.column('user_id', sa.Integer()),
+                            sa.column('unread_count', sa.Integer()))
+    messages = sa.table('chatmessages',
+                        sa.column('room_id', sa.Integer()),
+                        sa.column('sender_id', sa.Integer()),
+                        sa.column('is_read', sa.Boolean()))
+    unread = (
+        sa.select(sa.func.count())
+        .where(
+            messages.c.room_id == participants.c.room_id,
+            messages.c.sender_id != participants.c.user_id,
+            messages.c.is_read == sa.false()
+        )
+        .scalar_subquery()
+    )
+    op.execute(participants.update().values(unread_count=unread))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chatparticipants') as batch_op:
+        batch_op.drop_column('unread_count')
@@ -0,0 +1,81 @@
+"""search indexes
+
+Revision ID: 974f87e1c6d3
+Revises: b1adce06a588
+Create Date: 2026-10-18 14:40:12.318554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '974f87e1c6d3'
+down_revision: Union[str, Sequence[str], None] = 'b1adce06a588'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# полнотекстовые таблицы SQLite: имя -> (таблица-источник, индексируемые колонки)
+FTS_TABLES = {
+    'books_fts': ('books', ('title',)),
+    'authors_fts': ('authors', ('first_name', 'second_name', 'third_name')),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        # триграммы: поиск по подстроке (ILIKE) и нечеткий поиск (similarity, оператор %)
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX ix_books_title_trgm ON books USING gin (title gin_trgm_ops)')
+        op.execute(
+            "CREATE INDEX ix_authors_full_name_trgm ON authors USING gin "
+            "((first_name || ' ' || second_name || ' ' || coalesce(third_name, '')) gin_trgm_ops)"
+        )
+
+    elif dialect == 'sqlite':
+        # FTS5 с внешним содержимым: индекс поддерживают триггеры на исходной таблице.
+        # batch_alter_table пересоздает таблицу без триггеров - после него их нужно создать заново
+        for fts, (source, columns) in FTS_TABLES.items():
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{c}' for c in columns)
+            old_values = ', '.join(f'old.{c}' for c in columns)
+
+            op.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{source}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {source} BEGIN "
+                f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {source} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {names} ON {source} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END"
+            )
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_authors_full_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_books_title_trgm')
+
+    elif dialect == 'sqlite':
+        for fts in FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')
@@ -0,0 +1,49 @@
+"""read cursor for chat participants
+
+Revision ID: eb5697f6709c
+Revises: 796b727f5683
+Create Date: 2026-10-18 10:03:17.214880
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'eb5697f6709c'
+down_revision: Union[str, Sequence[str], None] = '796b727f5683'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chatparticipants', sa.Column('last_read_message_id', sa.Integer(), nullable=True))
+
+    # курсор прочтения - последнее сообщение, прочитанное или отправленное участником
+    participants = sa.table('chatparticipants',
+                            sa.column('room_id', sa.Integer()),
+                            sa.column('user_id', sa.Integer()),
+                            sa.column('last_read_message_id', sa.Integer()))
+    messages = sa.table('chatmessages',
+                        sa.column('id', sa.Integer()),
+                        sa.column('room_id', sa.Integer()),
+                        sa.column('sender_id', sa.Integer()),
+                        sa.column('is_read', sa.Boolean()))
+    last_read = (
+        sa.select(sa.func.max(messages.c.id))
+        .where(
+            messages.c.room_id == participants.c.room_id,
+            sa.or_(messages.c.is_read == sa.true(), messages.c.sender_id == participants.c.user_id)
+        )
+        .scalar_subquery()
+    )
+    op.execute(participants.update().values(last_read_message_id=last_read))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chatparticipants') as batch_op:
+        batch_op.drop_column('last_read_message_id')
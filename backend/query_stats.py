@@ -0,0 +1,148 @@
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.config import settings
+from backend.database.engine import engine
+from backend.responses import dumps
+
+SLOWEST_STATEMENT_LENGTH = 300  # символов SQL в логе
+
+logger = logging.getLogger('backend.requests')
+if not logger.handlers:  # строка лога - готовый JSON, без префиксов форматтера
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+@dataclass
+class QueryStats:
+    """SQL-запросы одного HTTP-запроса: число, суммарное время и самый медленный"""
+    count: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+    slowest_statement: str | None = None
+
+    def add(self, statement: str, duration: float):
+        self.count += 1
+        self.total += duration
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+    def server_timing(self, elapsed: float) -> str:
+        return (f'db;dur={self.total * 1000:.2f};desc="{self.count} SQL", '
+                f'db-slowest;dur={self.slowest * 1000:.2f}, app;dur={elapsed * 1000:.2f}')
+
+
+# Статистика текущего запроса. Контекст копируется в задачи и в greenlet, в котором
+# SQLAlchemy выполняет синхронную часть async-драйвера, поэтому события движка
+# видят запрос, в рамках которого выполняется SQL
+_query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def get_query_stats() -> QueryStats | None:
+    return _query_stats.get()
+
+
+# Время начала хранится в контексте выполнения оператора: он свой у каждого execute и
+# пропадает вместе с ним, поэтому упавший оператор (after_cursor_execute не вызывается)
+# не оставляет на соединении метку, которую потом снял бы чужой запрос
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if context is not None and _query_stats.get() is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, 'after_cursor_execute')
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    started = getattr(context, 'query_started', None)
+    if stats is None or started is None:
+        return
+    stats.add(statement, time.perf_counter() - started)
+
+
+def route_path(scope: Scope) -> str | None:
+    """Шаблон пути маршрута ('/books/{book_id}'), None - запрос не дошел до маршрута"""
+    return getattr(scope.get('route'), 'path', None)
+
+
+def route_name(scope: Scope) -> str:
+    """'GET /books/{book_id}' - шаблон пути маршрута, а не конкретный URL"""
+    return f'{scope["method"]} {route_path(scope) or scope["path"]}'
+
+
+class QueryStatsMiddleware:
+    """Учет SQL-запросов каждого HTTP-запроса.
+
+    В режиме отладки статистика уходит клиенту в заголовке Server-Timing (на момент начала
+    ответа - запросы при потоковой отдаче тела в него не попадают), в production - строкой
+    JSON в лог после ответа. Превышение бюджета запросов маршрута (SQL_QUERY_BUDGET,
+    SQL_QUERY_BUDGETS) логируется предупреждением в любом режиме.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                if settings.IS_DEBUG:
+                    MutableHeaders(scope=message).append('Server-Timing',
+                                                         stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _query_stats.reset(token)
+            self.report(scope, status_code, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def report(scope: Scope, status_code: int, stats: QueryStats, elapsed: float):
+        route = route_name(scope)
+        budget = settings.SQL_QUERY_BUDGETS.get(route, settings.SQL_QUERY_BUDGET)
+        exceeded = bool(budget) and stats.count > budget
+        if not exceeded and (settings.IS_DEBUG or not settings.SQL_REQUEST_LOG):
+            return
+
+        record = {
+            'event': 'query_budget_exceeded' if exceeded else 'request',
+            'route': route,
+            'path': scope['path'],
+            'status': status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'queries': stats.count,
+            'db_ms': round(stats.total * 1000, 2),
+            'slowest_ms': round(stats.slowest * 1000, 2),
+        }
+        if exceeded:
+            record['budget'] = budget
+        if stats.slowest_statement is not None:
+            record['slowest_sql'] = re.sub(r'\s+', ' ', stats.slowest_statement)[:SLOWEST_STATEMENT_LENGTH]
+
+        line = dumps(record).decode()
+        if exceeded:
+            logger.warning(line)
+        else:
+            logger.info(line)
@@ -1,8 +1,10 @@
+from sqlalchemy import func, literal_column, or_
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
 from backend.database.engine import get_async_session
 from backend.database.models import Author
+from backend.repository.search import authors_fts, is_postgres, fts_match_query, fts_match, like_pattern, trigram_match
 
 
 class AuthorRepository:
@@ -32,6 +34,42 @@ class AuthorRepository:
                 return authors.scalars().all()
 
 
+    @staticmethod
+    async def search_authors(query: str, limit: int, offset: int = 0) -> list[Author]:
+        """Поиск по имени, фамилии и отчеству через индекс: триграммы в PostgreSQL, FTS5 в SQLite"""
+        if is_postgres():
+            # то же выражение, что и в индексе ix_authors_full_name_trgm - константы без параметров
+            space = literal_column("' '")
+            full_name = (Author.first_name + space + Author.second_name + space
+                         + func.coalesce(Author.third_name, literal_column("''")))
+            stmt = (
+                select(Author)
+                .where(trigram_match(full_name, query))
+                .order_by(
+                    or_(
+                        Author.first_name.ilike(like_pattern(query, prefix_only=True), escape='\\'),
+                        Author.second_name.ilike(like_pattern(query, prefix_only=True), escape='\\')
+                    ).desc(),
+                    func.similarity(full_name, query).desc(),
+                    Author.id
+                )
+            )
+        else:
+            match = fts_match_query(query)
+            if match is None:
+                return []
+            stmt = (
+                select(Author)
+                .join(authors_fts, authors_fts.c.rowid == Author.id)
+                .where(fts_match('authors_fts')(match))
+                .order_by(func.bm25(literal_column('authors_fts')), Author.id)
+            )
+
+        async with get_async_session(False) as session:
+            authors = await session.execute(stmt.limit(limit).offset(offset))
+            return authors.scalars().all()
+
+
     @staticmethod
     async def update_author(author_id: int, **fields) -> Author | None:
         if 'id' in fields: del fields['id']
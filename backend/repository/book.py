@@ -1,8 +1,14 @@
+from typing import AsyncIterator
+
+from sqlalchemy import func, literal_column
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
 from backend.database.engine import get_async_session
 from backend.database.models import Book
+from backend.repository.search import books_fts, is_postgres, fts_match_query, fts_match, like_pattern, trigram_match
+
+STREAM_PARTITION_SIZE = 500
 
 
 class BookRepository:
@@ -32,6 +38,64 @@ class BookRepository:
                 return books.scalars().all()
 
 
+    @staticmethod
+    async def stream_books(limit: int, after: int | None = None, author: int | None = None,
+                           genre: int | None = None, year_from: int | None = None,
+                           year_to: int | None = None, available_only: bool = False) -> AsyncIterator[dict]:
+        """Страница каталога по курсору (keyset по id), строки отдаются потоком как dict колонок"""
+        query = select(*Book.__table__.c)
+        if after is not None:
+            query = query.where(Book.id > after)
+        if author is not None:
+            query = query.where(Book.author == author)
+        if genre is not None:
+            query = query.where(Book.genre == genre)
+        if year_from is not None:
+            query = query.where(Book.publication_year >= year_from)
+        if year_to is not None:
+            query = query.where(Book.publication_year <= year_to)
+        if available_only:
+            query = query.where(Book.reserved_by.is_(None))
+        query = query.order_by(Book.id).limit(limit)
+
+        async with get_async_session(False) as session:
+            books = await session.stream(query)
+            # пачками: построчная итерация - это переход в поток драйвера на каждую строку
+            async for partition in books.mappings().partitions(STREAM_PARTITION_SIZE):
+                for book in partition:
+                    yield dict(book)
+
+
+    @staticmethod
+    async def search_books(query: str, limit: int, offset: int = 0) -> list[Book]:
+        """Поиск по названию через индекс: триграммы в PostgreSQL, FTS5 в SQLite.
+        Сначала совпадения с начала названия, затем по релевантности"""
+        if is_postgres():
+            stmt = (
+                select(Book)
+                .where(trigram_match(Book.title, query))
+                .order_by(
+                    Book.title.ilike(like_pattern(query, prefix_only=True), escape='\\').desc(),
+                    func.similarity(Book.title, query).desc(),
+                    Book.id
+                )
+            )
+        else:
+            match = fts_match_query(query)
+            if match is None:
+                return []
+            stmt = (
+                select(Book)
+                .join(books_fts, books_fts.c.rowid == Book.id)
+                .where(fts_match('books_fts')(match))
+                .order_by(func.bm25(literal_column('books_fts')), Book.id)
+            )
+
+        async with get_async_session(False) as session:
+            books = await session.execute(stmt.limit(limit).offset(offset))
+            return books.scalars().all()
+
+
     @staticmethod
     async def update_book(book_id: int, **fields) -> Book | None:
         if 'id' in fields: del fields['id']
@@ -1,3 +1,4 @@
+from sqlalchemy import update, insert
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
@@ -10,31 +11,72 @@ class BookingRepository:
     async def create_booking(**fields) -> Booking | None:
         if 'id' in fields:
             del fields['id']
+        if fields.get('take_date') is None:
+            fields.pop('take_date', None)  # дата выдачи по умолчанию - из БД
 
         async with get_async_session() as session:
-            # Проверяем, доступна ли книга
-            book = await session.execute(
-                select(Book).where(Book.id == fields['book_id'])
+            # Резервируем книгу условным UPDATE: из двух одновременных запросов его пройдет только один
+            reserved = await session.execute(
+                update(Book)
+                .where(Book.id == fields['book_id'], Book.reserved_by.is_(None))
+                .values(reserved_by=fields['user_id'])
+                .returning(Book.id)
             )
-            book = book.scalar_one_or_none()
-
-            if not book:
-                raise ValueError('Book not found')
-
-            if book.reserved_by is not None:
+            if reserved.scalar_one_or_none() is None:
+                exists = await session.execute(select(Book.id).where(Book.id == fields['book_id']))
+                if exists.scalar_one_or_none() is None:
+                    raise ValueError('Book not found')
                 raise ValueError('Book is already reserved')
 
-            new_booking = Booking(**fields)
             try:
-                # Резервируем книгу
-                book.reserved_by = fields['user_id']
-                session.add(new_booking)
-                await session.flush()
-                await session.refresh(new_booking)
+                result = await session.execute(insert(Booking).values(**fields).returning(Booking))
+                new_booking = result.scalar_one()
             except IntegrityError as error:
                 raise ValueError(f'Error on booking creation: {str(error)}')
         return new_booking
 
+    @staticmethod
+    async def checkout_books(user_id: int, book_ids: list[int]) -> list[tuple[int, str, Booking | None]]:
+        """Забронировать несколько книг в одной транзакции.
+
+        Возвращает (book_id, статус, бронирование) по каждой книге в порядке запроса;
+        статус - 'reserved', 'unavailable' (уже забронирована) или 'not_found'.
+        """
+        book_ids = list(dict.fromkeys(book_ids))
+
+        async with get_async_session() as session:
+            reserved = await session.execute(
+                update(Book)
+                .where(Book.id.in_(book_ids), Book.reserved_by.is_(None))
+                .values(reserved_by=user_id)
+                .returning(Book.id)
+            )
+            reserved_ids = set(reserved.scalars().all())
+
+            bookings: dict[int, Booking] = {}
+            if reserved_ids:
+                result = await session.execute(
+                    insert(Booking)
+                    .values([{'user_id': user_id, 'book_id': book_id}
+                             for book_id in book_ids if book_id in reserved_ids])
+                    .returning(Booking)
+                )
+                bookings = {booking.book_id: booking for booking in result.scalars().all()}
+
+            existing_ids = set(reserved_ids)
+            if len(reserved_ids) < len(book_ids):
+                # Только для неудачных: отличаем занятую книгу от несуществующей
+                existing = await session.execute(
+                    select(Book.id).where(Book.id.in_([i for i in book_ids if i not in reserved_ids]))
+                )
+                existing_ids.update(existing.scalars().all())
+
+        return [
+            (book_id, 'reserved', bookings[book_id]) if book_id in bookings
+            else (book_id, 'unavailable' if book_id in existing_ids else 'not_found', None)
+            for book_id in book_ids
+        ]
+
     @staticmethod
     async def get_booking(booking_id: int | None = None, user_id: int | None = None) -> Booking | list[Booking] | None:
         async with get_async_session(False) as session:
@@ -52,6 +94,16 @@ class BookingRepository:
                 bookings = await session.execute(select(Booking))
                 return bookings.scalars().all()
 
+    @staticmethod
+    async def list_bookings(user_id: int | None = None) -> list[dict]:
+        """Бронирования (все или пользователя) строками колонок - для списка без ORM-объектов"""
+        query = select(*Booking.__table__.c)
+        if user_id is not None:
+            query = query.where(Booking.user_id == user_id)
+        async with get_async_session(False) as session:
+            bookings = await session.execute(query.order_by(Booking.id))
+            return [dict(booking) for booking in bookings.mappings()]
+
     @staticmethod
     async def update_booking(booking_id: int, **fields) -> Booking | None:
         if 'id' in fields:
@@ -83,12 +135,9 @@ class BookingRepository:
 
             if booking is not None:
                 # Освобождаем книгу при удалении бронирования
-                book = await session.execute(
-                    select(Book).where(Book.id == booking.book_id)
+                await session.execute(
+                    update(Book).where(Book.id == booking.book_id).values(reserved_by=None)
                 )
-                book = book.scalar_one_or_none()
-                if book:
-                    book.reserved_by = None
 
                 await session.delete(booking)
                 return True
@@ -114,12 +163,9 @@ class BookingRepository:
             booking.end_date = datetime.now()
 
             # Освобождаем книгу
-            book = await session.execute(
-                select(Book).where(Book.id == booking.book_id)
+            await session.execute(
+                update(Book).where(Book.id == booking.book_id).values(reserved_by=None)
             )
-            book = book.scalar_one_or_none()
-            if book:
-                book.reserved_by = None
 
             await session.flush()
             await session.refresh(booking)
@@ -1,9 +1,34 @@
-from sqlalchemy import select, or_, and_
+from sqlalchemy import select, insert, update, or_, and_, func, literal, false, bindparam, String, Text
 from sqlalchemy.orm import joinedload, selectinload
-from typing import List, Optional
+from datetime import datetime, UTC
+from typing import Dict, List, Optional
 
-from backend.database.engine import get_async_session
+from backend.cache import create_cache
+from backend.config import settings
+from backend.database.engine import after_commit, get_async_session
 from backend.database.models import ChatRoom, ChatParticipant, ChatMessage, User
+from backend.repository.search import is_postgres
+
+# членство и роль пользователя в комнате, ключ - "room_id:user_id";
+# изменения сбрасываются во всех воркерах (invalidate), запись сообщений проверяет членство в БД
+membership_cache = create_cache('chat_membership', settings.MEMBERSHIP_CACHE_TTL, settings.MEMBERSHIP_CACHE_SIZE)
+
+
+def created_before(value: datetime):
+    """Граница created_at от клиента в формате хранения.
+
+    SQLite хранит время строкой в UTC: CURRENT_TIMESTAMP - без долей секунды, значения
+    из Python - с микросекундами, и строки одного момента в разных форматах не равны.
+    Граница без долей секунды передается в формате CURRENT_TIMESTAMP - тогда сравнение
+    строк совпадает со сравнением времени для обоих форматов.
+    """
+    if is_postgres():
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    if value.microsecond:
+        return value
+    return literal(value.strftime('%Y-%m-%d %H:%M:%S'), String)
 
 
 class ChatRepository:
@@ -30,15 +55,22 @@ class ChatRepository:
             if existing.scalar_one_or_none():
                 raise ValueError("User is already a participant in this room")
 
+            # Курсор прочтения - на последнем сообщении комнаты: история до вступления
+            # не считается непрочитанной (unread_count = 0 ей соответствует)
+            last_message_id = await session.scalar(
+                select(func.max(ChatMessage.id)).where(ChatMessage.room_id == room_id)
+            )
             participant = ChatParticipant(
                 room_id=room_id,
                 user_id=user_id,
-                is_admin=is_admin
+                is_admin=is_admin,
+                last_read_message_id=last_message_id
             )
             session.add(participant)
             await session.flush()
             await session.refresh(participant)
-            return participant
+        await after_commit(membership_cache.invalidate, f'{room_id}:{user_id}')
+        return participant
 
     @staticmethod
     async def create_private_chat(user1_id: int, user2_id: int) -> ChatRoom:
@@ -129,6 +161,37 @@ class ChatRepository:
             rooms = result.unique().scalars().all()
             return rooms
 
+    @staticmethod
+    async def get_user_chat_rooms_summary(user_id: int) -> List[dict]:
+        """Получить чаты пользователя с числом участников и непрочитанных одним запросом"""
+        user_rooms = select(ChatParticipant.room_id).where(ChatParticipant.user_id == user_id)
+
+        participant_counts = (
+            select(ChatParticipant.room_id, func.count().label('participant_count'))
+            .where(ChatParticipant.room_id.in_(user_rooms))
+            .group_by(ChatParticipant.room_id)
+            .subquery()
+        )
+
+        async with get_async_session(commit=False) as session:
+            result = await session.execute(
+                select(
+                    ChatRoom.id,
+                    ChatRoom.name,
+                    ChatRoom.is_group,
+                    ChatRoom.created_at,
+                    participant_counts.c.participant_count,
+                    ChatParticipant.unread_count
+                )
+                .join(
+                    ChatParticipant,
+                    and_(ChatParticipant.room_id == ChatRoom.id, ChatParticipant.user_id == user_id)
+                )
+                .join(participant_counts, participant_counts.c.room_id == ChatRoom.id)
+                .order_by(ChatRoom.id)
+            )
+            return [dict(row) for row in result.mappings().all()]
+
     @staticmethod
     async def get_chat_room(room_id: int, user_id: Optional[int] = None) -> Optional[ChatRoom]:
         """Получить комнату чата по ID с проверкой доступа"""
@@ -141,6 +204,28 @@ class ChatRepository:
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_membership(room_id: int, user_id: int) -> Optional[dict]:
+        """Членство пользователя в комнате: {"is_admin", "is_group"} или None (кэшируется)"""
+        key = f'{room_id}:{user_id}'
+        membership = await membership_cache.get(key)
+        if membership is not None:
+            return membership
+
+        async with get_async_session(commit=False) as session:
+            result = await session.execute(
+                select(ChatParticipant.is_admin, ChatRoom.is_group)
+                .join(ChatRoom, ChatRoom.id == ChatParticipant.room_id)
+                .where(and_(ChatParticipant.room_id == room_id, ChatParticipant.user_id == user_id))
+            )
+            membership = result.mappings().one_or_none()
+
+        if membership is None:
+            return None
+        membership = dict(membership)
+        await membership_cache.set(key, membership)
+        return membership
+
     @staticmethod
     async def get_room_participants(room_id: int) -> List[ChatParticipant]:
         """Получить всех участников комнаты"""
@@ -153,6 +238,20 @@ class ChatRepository:
             participants = result.unique().scalars().all()
             return participants
 
+    @staticmethod
+    async def get_room_participant_rows(room_id: int) -> List[dict]:
+        """Участники комнаты строками с полями ChatParticipantResponse (для списка в API)"""
+        async with get_async_session(commit=False) as session:
+            result = await session.execute(
+                select(
+                    ChatParticipant.id, ChatParticipant.room_id, ChatParticipant.user_id,
+                    ChatParticipant.is_admin, ChatParticipant.joined_at, User.username, User.email
+                )
+                .join(User, User.id == ChatParticipant.user_id)
+                .where(ChatParticipant.room_id == room_id)
+            )
+            return [dict(participant) for participant in result.mappings()]
+
     @staticmethod
     async def save_message(room_id: int, sender_id: int, content: str, message_type: str = "text") -> ChatMessage:
         """Сохранить сообщение в базе данных"""
@@ -180,47 +279,212 @@ class ChatRepository:
             await session.flush()
             await session.refresh(message)
 
+            # Увеличиваем счетчики непрочитанных у остальных участников
+            await session.execute(
+                update(ChatParticipant)
+                .where(and_(ChatParticipant.room_id == room_id, ChatParticipant.user_id != sender_id))
+                .values(unread_count=ChatParticipant.unread_count + 1)
+            )
+
             # Загружаем отправителя
             await session.refresh(message, ['sender'])
 
             return message
 
     @staticmethod
-    async def get_room_messages(room_id: int, limit: int = 50, offset: int = 0) -> List[ChatMessage]:
-        """Получить сообщения комнаты с пагинацией"""
+    async def insert_message(room_id: int, sender_id: int, content: str,
+                             message_type: str = "text") -> Optional[dict]:
+        """Сохранить сообщение одним INSERT ... SELECT ... RETURNING.
+
+        Проверка участия выполняется в том же запросе; None - отправитель не участник комнаты.
+        """
+        is_participant = (
+            select(ChatParticipant.id)
+            .where(and_(ChatParticipant.room_id == room_id, ChatParticipant.user_id == sender_id))
+            .exists()
+        )
+        values = select(
+            literal(room_id),
+            literal(sender_id),
+            literal(content, Text),
+            literal(message_type, String),
+            func.now(),
+            false()
+        ).where(is_participant)
+
+        async with get_async_session() as session:
+            result = await session.execute(
+                insert(ChatMessage)
+                .from_select(
+                    [ChatMessage.room_id, ChatMessage.sender_id, ChatMessage.content,
+                     ChatMessage.message_type, ChatMessage.created_at, ChatMessage.is_read],
+                    values
+                )
+                .returning(
+                    ChatMessage.id, ChatMessage.room_id, ChatMessage.sender_id, ChatMessage.content,
+                    ChatMessage.message_type, ChatMessage.created_at, ChatMessage.is_read
+                )
+            )
+            message = result.mappings().one_or_none()
+            if message is None:
+                return None
+
+            # Увеличиваем счетчики непрочитанных у остальных участников
+            await session.execute(
+                update(ChatParticipant)
+                .where(and_(ChatParticipant.room_id == room_id, ChatParticipant.user_id != sender_id))
+                .values(unread_count=ChatParticipant.unread_count + 1)
+                .execution_options(synchronize_session=False)
+            )
+            return dict(message)
+
+    @staticmethod
+    async def insert_messages(messages: List[dict]) -> List[Optional[dict]]:
+        """Сохранить пачку сообщений многострочным INSERT ... RETURNING в одной транзакции.
+
+        Участие отправителей проверяется в той же транзакции (строки участников блокируются
+        от удаления до фиксации); сообщения не участников не пишутся. Результат - в порядке
+        входных сообщений, None на месте отклоненных.
+        """
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(ChatParticipant.room_id, ChatParticipant.user_id)
+                .where(
+                    and_(
+                        ChatParticipant.room_id.in_({message["room_id"] for message in messages}),
+                        ChatParticipant.user_id.in_({message["sender_id"] for message in messages})
+                    )
+                )
+                .with_for_update(read=True)
+            )
+            members = set(result.tuples())
+            accepted = [message for message in messages if (message["room_id"], message["sender_id"]) in members]
+            if not accepted:
+                return [None] * len(messages)
+
+            result = await session.execute(
+                insert(ChatMessage).returning(
+                    ChatMessage.id, ChatMessage.room_id, ChatMessage.sender_id, ChatMessage.content,
+                    ChatMessage.message_type, ChatMessage.created_at, ChatMessage.is_read,
+                    sort_by_parameter_order=True
+                ),
+                accepted
+            )
+            inserted = iter([dict(row) for row in result.mappings().all()])
+            rows = [next(inserted) if (message["room_id"], message["sender_id"]) in members else None
+                    for message in messages]
+
+            # Счетчики непрочитанных: по одному UPDATE на (комнату, отправителя), одним executemany
+            sent: Dict[tuple, int] = {}
+            for message in accepted:
+                key = (message["room_id"], message["sender_id"])
+                sent[key] = sent.get(key, 0) + 1
+
+            participants = ChatParticipant.__table__
+            await session.execute(
+                participants.update()
+                .where(
+                    and_(
+                        participants.c.room_id == bindparam("b_room_id"),
+                        participants.c.user_id != bindparam("b_sender_id")
+                    )
+                )
+                .values(unread_count=participants.c.unread_count + bindparam("b_count")),
+                [{"b_room_id": room_id, "b_sender_id": sender_id, "b_count": count}
+                 for (room_id, sender_id), count in sent.items()]
+            )
+            return rows
+
+    @staticmethod
+    async def get_room_messages(room_id: int, limit: int = 50, offset: int = 0,
+                                before_id: Optional[int] = None,
+                                before_ts: Optional[datetime] = None) -> List[dict]:
+        """Получить сообщения комнаты с пагинацией - строками с полями ChatMessageResponse.
+
+        Курсор before_id (keyset по (created_at, id)) читает страницу диапазоном по индексу
+        (room_id, created_at, id) без OFFSET; время курсора берется из строки before_id,
+        before_ts при этом не используется. before_ts без before_id - граница по времени.
+        """
+        query = (
+            select(*ChatMessage.__table__.c, User.username.label("sender_username"))
+            .outerjoin(User, User.id == ChatMessage.sender_id)
+            .where(ChatMessage.room_id == room_id)
+        )
+
+        if before_id is not None:
+            # время - из самой строки: оно сравнивается со столбцом в том же формате хранения
+            cursor_ts = (
+                select(ChatMessage.created_at)
+                .where(ChatMessage.id == before_id)
+                .scalar_subquery()
+            )
+            query = query.where(
+                or_(
+                    ChatMessage.created_at < cursor_ts,
+                    and_(ChatMessage.created_at == cursor_ts, ChatMessage.id < before_id)
+                )
+            )
+        elif before_ts is not None:
+            query = query.where(ChatMessage.created_at < created_before(before_ts))
+
         async with get_async_session(commit=False) as session:
             result = await session.execute(
-                select(ChatMessage)
-                .where(ChatMessage.room_id == room_id)
-                .order_by(ChatMessage.created_at.desc())
+                query
+                .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
                 .limit(limit)
                 .offset(offset)
-                .options(joinedload(ChatMessage.sender))  # Загружаем отправителя
             )
-            messages = result.unique().scalars().all()
-            return messages
+            return [dict(message) for message in result.mappings()]
 
     @staticmethod
     async def mark_messages_as_read(room_id: int, user_id: int) -> int:
         """Пометить все непрочитанные сообщения в комнате как прочитанные для пользователя"""
         async with get_async_session() as session:
-            # Получаем все сообщения, которые отправили не мы и которые еще не прочитаны
+            last_message_id = (
+                select(func.max(ChatMessage.id))
+                .where(ChatMessage.room_id == room_id)
+                .scalar_subquery()
+            )
+            has_newer = (
+                select(ChatMessage.id)
+                .where(
+                    and_(
+                        ChatMessage.room_id == room_id,
+                        ChatMessage.id > func.coalesce(ChatParticipant.last_read_message_id, 0)
+                    )
+                )
+                .exists()
+            )
+
+            # Сдвигаем курсор прочтения участника, только если после него есть сообщения
+            # (или счетчик не обнулен); в пустой комнате и в конце истории строку не трогаем
+            await session.execute(
+                update(ChatParticipant)
+                .where(
+                    and_(
+                        ChatParticipant.room_id == room_id,
+                        ChatParticipant.user_id == user_id,
+                        or_(ChatParticipant.unread_count > 0, has_newer)
+                    )
+                )
+                .values(last_read_message_id=last_message_id, unread_count=0)
+                .execution_options(synchronize_session=False)
+            )
+
+            # Одним UPDATE помечаем чужие непрочитанные сообщения
             result = await session.execute(
-                select(ChatMessage).where(
+                update(ChatMessage)
+                .where(
                     and_(
                         ChatMessage.room_id == room_id,
                         ChatMessage.sender_id != user_id,
                         ChatMessage.is_read == False
                     )
                 )
+                .values(is_read=True)
+                .execution_options(synchronize_session=False)
             )
-            messages = result.scalars().all()
-
-            for message in messages:
-                message.is_read = True
-
-            await session.flush()
-            return len(messages)
+            return result.rowcount
 
     @staticmethod
     async def get_message_with_sender(message_id: int) -> Optional[ChatMessage]:
@@ -235,11 +499,11 @@ class ChatRepository:
 
     @staticmethod
     async def mark_message_as_read(message_id: int, user_id: int) -> bool:
-        """Пометить конкретное сообщение как прочитанное"""
+        """Пометить конкретное сообщение (и все предыдущие) как прочитанное"""
         async with get_async_session() as session:
             try:
                 result = await session.execute(
-                    select(ChatMessage)
+                    update(ChatMessage)
                     .where(
                         and_(
                             ChatMessage.id == message_id,
@@ -247,14 +511,40 @@ class ChatRepository:
                             ChatMessage.is_read == False
                         )
                     )
+                    .values(is_read=True)
+                    .execution_options(synchronize_session=False)
                 )
-                message = result.scalar_one_or_none()
 
-                if message:
-                    message.is_read = True
-                    await session.flush()
-                    return True
-                return False
+                # Курсор только растет, счетчик пересчитываем по сообщениям после курсора
+                unread_after = (
+                    select(func.count())
+                    .where(
+                        and_(
+                            ChatMessage.room_id == ChatParticipant.room_id,
+                            ChatMessage.id > message_id,
+                            ChatMessage.sender_id != user_id
+                        )
+                    )
+                    .scalar_subquery()
+                )
+                cursor = await session.execute(
+                    update(ChatParticipant)
+                    .where(
+                        and_(
+                            ChatParticipant.user_id == user_id,
+                            ChatParticipant.room_id == select(ChatMessage.room_id)
+                            .where(ChatMessage.id == message_id)
+                            .scalar_subquery(),
+                            or_(
+                                ChatParticipant.last_read_message_id.is_(None),
+                                ChatParticipant.last_read_message_id < message_id
+                            )
+                        )
+                    )
+                    .values(last_read_message_id=message_id, unread_count=unread_after)
+                    .execution_options(synchronize_session=False)
+                )
+                return result.rowcount > 0 or cursor.rowcount > 0
             except Exception as e:
                 print(f"Error marking message as read: {e}")
                 return False
@@ -270,10 +560,11 @@ class ChatRepository:
             )
             participant = participant.scalar_one_or_none()
 
-            if participant:
-                await session.delete(participant)
-                return True
-            return False
+            if not participant:
+                return False
+            await session.delete(participant)
+        await after_commit(membership_cache.invalidate, f'{room_id}:{user_id}')
+        return True
 
     @staticmethod
     async def delete_chat_room(room_id: int) -> bool:
@@ -282,40 +573,35 @@ class ChatRepository:
             room = await session.execute(select(ChatRoom).where(ChatRoom.id == room_id))
             room = room.scalar_one_or_none()
 
-            if room:
-                await session.delete(room)
-                return True
-            return False
+            if not room:
+                return False
+            await session.delete(room)
+        await after_commit(membership_cache.invalidate_prefix, f'{room_id}:')
+        return True
 
     @staticmethod
     async def get_unread_count(user_id: int, room_id: Optional[int] = None) -> int:
-        """Получить количество непрочитанных сообщений"""
+        """Получить количество непрочитанных сообщений (по денормализованным счетчикам)"""
         async with get_async_session(commit=False) as session:
-            # Создаем явный JOIN с указанием условия
-            query = (
-                select(ChatMessage)
-                .select_from(ChatMessage)
-                .join(
-                    ChatParticipant,
-                    and_(
-                        ChatMessage.room_id == ChatParticipant.room_id,
-                        ChatParticipant.user_id == user_id
-                    )
-                )
-                .where(
-                    and_(
-                        ChatMessage.sender_id != user_id,
-                        ChatMessage.is_read == False
-                    )
-                )
+            query = select(func.coalesce(func.sum(ChatParticipant.unread_count), 0)).where(
+                ChatParticipant.user_id == user_id
             )
-
             if room_id:
-                query = query.where(ChatMessage.room_id == room_id)
+                query = query.where(ChatParticipant.room_id == room_id)
 
             result = await session.execute(query)
-            messages = result.scalars().all()
-            return len(messages)
+            return result.scalar_one()
+
+    @staticmethod
+    async def get_unread_counts_by_room(user_id: int) -> Dict[int, int]:
+        """Получить количество непрочитанных сообщений по каждой комнате пользователя"""
+        async with get_async_session(commit=False) as session:
+            result = await session.execute(
+                select(ChatParticipant.room_id, ChatParticipant.unread_count)
+                .where(ChatParticipant.user_id == user_id)
+            )
+            return {room_id: count for room_id, count in result.all()}
+
 
 async def get_chat_repository() -> ChatRepository:
     return ChatRepository()
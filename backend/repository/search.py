@@ -0,0 +1,36 @@
+import re
+
+from sqlalchemy import ColumnElement, literal_column, table, column, or_
+
+from backend.database.engine import engine
+
+# FTS5-таблицы SQLite из миграции search_indexes, rowid совпадает с id исходной строки
+books_fts = table('books_fts', column('rowid'))
+authors_fts = table('authors_fts', column('rowid'))
+
+
+def is_postgres() -> bool:
+    return engine.dialect.name == 'postgresql'
+
+
+def fts_match_query(query: str) -> str | None:
+    """Запрос FTS5: каждое слово - префикс, все слова обязательны.
+    Кавычки вокруг слов экранируют синтаксис FTS5 во вводе пользователя"""
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def like_pattern(query: str, prefix_only: bool = False) -> str:
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%' if prefix_only else f'%{escaped}%'
+
+
+def trigram_match(expression: ColumnElement, query: str) -> ColumnElement:
+    """Подстрока или нечеткое совпадение (порог pg_trgm.similarity_threshold) - обе проверки идут по GIN-индексу"""
+    return or_(expression.ilike(like_pattern(query), escape='\\'), expression.op('%')(query))
+
+
+def fts_match(fts_table: str) -> ColumnElement:
+    return literal_column(fts_table).op('MATCH')
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from sqlalchemy.future import select
+
+from backend.database.engine import get_async_session, get_unit_of_work
+from backend.database.models import TableVersion
+
+
+class TableVersionRepository:
+    @staticmethod
+    async def get_versions(tables: tuple[str, ...]) -> dict[str, tuple[int, datetime | None]]:
+        """Версии и время последнего изменения таблиц; неизвестная таблица - версия 0.
+        В запросе читаются один раз: ETag и ключи кэша сервисов берут одну и ту же версию"""
+        uow = get_unit_of_work()
+        if uow is not None and all(table in uow.table_versions for table in tables):
+            return {table: uow.table_versions[table] for table in tables}
+
+        async with get_async_session(False) as session:
+            result = await session.execute(
+                select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+                .where(TableVersion.table_name.in_(tables))
+            )
+            versions = {name: (version, updated_at) for name, version, updated_at in result}
+        versions = {table: versions.get(table, (0, None)) for table in tables}
+        if uow is not None:
+            uow.table_versions.update(versions)
+        return versions
+
+    @staticmethod
+    async def get_version(table: str) -> int:
+        return (await TableVersionRepository.get_versions((table,)))[table][0]
+
+
+async def get_table_version_repository() -> TableVersionRepository:
+    return TableVersionRepository()
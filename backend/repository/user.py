@@ -3,8 +3,13 @@ from datetime import datetime, UTC
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
+from backend.cache import create_cache
+from backend.config import settings
 from backend.database.models import User
-from backend.database.engine import get_async_session
+from backend.database.engine import after_commit, get_async_session
+
+# аутентифицированные пользователи по email (subject токена)
+user_cache = create_cache('users', settings.USER_CACHE_TTL, settings.USER_CACHE_SIZE)
 
 
 class UserRepository:
@@ -40,11 +45,13 @@ class UserRepository:
             user = user.scalar_one_or_none()
             if user is None:
                 raise ValueError(f'User not found: {user_id}')
+            old_email = user.email
             for field, value in fields.items():
                 setattr(user, field, value)
             await session.flush()
             await session.refresh(user)
-            return user
+        await after_commit(user_cache.delete, old_email, user.email)
+        return user
 
     async def delete_user(self, user_id: int) -> bool:
         async with get_async_session(commit=True) as session:
@@ -53,6 +60,7 @@ class UserRepository:
             if user is None:
                 raise ValueError(f'User not found: {user_id}')
             await session.delete(user)
+        await after_commit(user_cache.delete, user.email)
         return True
 
     async def user_access(self, user_id: int) -> bool:
@@ -73,7 +81,8 @@ class UserRepository:
             user.password_hash = new_password
             await session.flush()
             await session.refresh(user)
-            return user
+        await after_commit(user_cache.delete, email)
+        return user
 
 
 async def get_user_repository() -> UserRepository:
@@ -0,0 +1,111 @@
+import hashlib
+from datetime import UTC
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Mapping
+
+from fastapi import HTTPException, Request, Response, status
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+from backend.repository.table_version import TableVersionRepository
+
+try:
+    import orjson
+except ImportError:  # без orjson сериализует pydantic-core - медленнее, но без лишней зависимости
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        # OPT_UTC_Z - даты в UTC с суффиксом Z, как их выводит pydantic
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return to_json(content)
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ, сериализуемый сразу в байты (orjson, если установлен)"""
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+_list_adapters: dict[type[BaseModel], TypeAdapter] = {}
+
+
+def serialize_rows(rows: list[Mapping], schema: type[BaseModel]) -> bytes:
+    """Проверить строки схемой одним TypeAdapter(list[schema]) и сериализовать результат.
+
+    В JSON попадают только поля схемы: лишняя колонка запроса (например, хэш пароля
+    из соединенной таблицы) не уйдет клиенту, а расхождение типов - ошибка в любом режиме.
+    """
+    adapter = _list_adapters.get(schema)
+    if adapter is None:
+        adapter = _list_adapters[schema] = TypeAdapter(list[schema])
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def rows_response(rows: list[Mapping], schema: type[BaseModel],
+                  headers: Mapping[str, str] | None = None) -> Response:
+    """Ответ-список из строк БД (dict с полями схемы) без ORM-объектов и повторной проверки
+    FastAPI по response_model: строки один раз проходят схему в serialize_rows.
+    response_model эндпоинта остается для документации OpenAPI.
+    """
+    return Response(serialize_rows(rows, schema), media_type='application/json', headers=headers)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def _not_modified_since(if_modified_since: str, last_modified) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return since is not None and last_modified.replace(microsecond=0) <= since
+
+
+def conditional_get(*tables: str) -> Callable:
+    """Зависимость для GET-эндпоинтов каталога: ETag и Last-Modified по версиям таблиц.
+
+    Если клиент прислал актуальный If-None-Match (или If-Modified-Since без него), сразу
+    отвечает 304 - запрос строк и сериализация не выполняются. Иначе ставит заголовки
+    в response и возвращает их для эндпоинтов, которые сами создают Response.
+    """
+
+    async def dependency(request: Request, response: Response) -> dict[str, str]:
+        versions = await TableVersionRepository.get_versions(tables)
+
+        # версии читаются до строк: при параллельной записи ETag может лишь устареть, но не опередить данные
+        fingerprint = f'{request.url.path}?{request.url.query}|' + ','.join(
+            f'{table}:{version}' for table, (version, _) in versions.items()
+        )
+        etag = '"' + hashlib.blake2b(fingerprint.encode(), digest_size=12).hexdigest() + '"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        modified = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+        last_modified = None
+        if modified:
+            last_modified = max(modified)
+            if last_modified.tzinfo is None:  # SQLite хранит время без зоны, в UTC
+                last_modified = last_modified.replace(tzinfo=UTC)
+            headers['Last-Modified'] = format_datetime(last_modified.astimezone(UTC), usegmt=True)
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        else:
+            if_modified_since = request.headers.get('if-modified-since')
+            not_modified = (if_modified_since is not None and last_modified is not None
+                            and _not_modified_since(if_modified_since, last_modified))
+        if not_modified:
+            raise HTTPException(status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response.headers.update(headers)
+        return headers
+
+    return dependency
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Literal
 
 
 class BookingBase(BaseModel):
@@ -23,3 +23,18 @@ class BookingFull(BookingBase):
 
 class BookingComplete(BaseModel):
     end_date: datetime = Field(default_factory=datetime.now)
+
+
+class BookingCheckout(BaseModel):
+    book_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class BookingCheckoutItem(BaseModel):
+    book_id: int
+    status: Literal['reserved', 'unavailable', 'not_found']
+    booking: Optional[BookingFull] = None
+
+
+class BookingCheckoutResult(BaseModel):
+    reserved: int
+    items: list[BookingCheckoutItem]
@@ -16,6 +16,7 @@ class ChatRoomResponse(ChatRoomBase):
     id: int
     created_at: datetime
     participant_count: int
+    unread_count: int = 0
 
     class Config:
         from_attributes = True
@@ -1,3 +1,6 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, UTC
 
 from fastapi import Depends, HTTPException, status
@@ -6,10 +9,11 @@ from jose import JWTError, jwt, ExpiredSignatureError
 from passlib.context import CryptContext
 
 from backend.config import settings
-from backend.repository.user import UserRepository, get_user_repository
+from backend.repository.user import UserRepository, get_user_repository, user_cache
+from backend.schemas.user import UserResponse
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 
 # ------------------- Password Hashing -------------------
@@ -21,6 +25,87 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Проверка пароля; если хэш создан со старой стоимостью bcrypt - возвращает новый хэш"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Выполняет bcrypt в пуле потоков (или процессов), не блокируя event loop.
+
+    Одновременно считается не больше workers хэшей, остальные ждут в очереди.
+    """
+
+    def __init__(self, workers: int, executor_kind: str = 'thread'):
+        self.workers = workers
+        self.executor_kind = executor_kind
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        queue_time = time.perf_counter() - queued_at
+        self.queue_time_total += queue_time
+        self.queue_time_max = max(self.queue_time_max, queue_time)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'queue_time_avg': self.queue_time_total / self.completed if self.completed else 0.0,
+            'queue_time_max': self.queue_time_max,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_EXECUTOR)
+
+
 # ------------------- JWT Token Handling -------------------
 def create_access_token(data: dict) -> str:
     expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -40,7 +125,7 @@ def create_access_token(data: dict) -> str:
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
         repo: UserRepository = Depends(get_user_repository)
-):
+) -> UserResponse:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid credentials.",
@@ -66,9 +151,16 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
+    # в кэше - словарь публичных полей: ни хэша пароля, ни ORM-объекта, привязанного к сессии
+    cached = await user_cache.get(email)
+    if cached is not None:
+        return UserResponse(**cached)
+
     user = await repo.get_user_by_email(email)
     if user is None:
         raise credentials_exception
+    user = UserResponse.model_validate(user)
+    await user_cache.set(email, user.model_dump())
     return user
 
 
@@ -1,6 +1,17 @@
+from backend.cache import create_cache
+from backend.config import settings
 from backend.repository.author import AuthorRepository, get_author_repository
+from backend.repository.table_version import TableVersionRepository
 from backend.schemas.author import AuthorFull, AuthorDefault
 
+# в кэше - словари (model_dump), чтобы его можно было перенести в общее хранилище;
+# ключ - версия таблицы authors (та же, что в ETag) и 'all' для полного списка или id.
+# Любая запись - через сервис, загрузчик фикстур, сырой SQL или в другом воркере - меняет
+# версию, и старые записи больше не читаются (вытесняются по TTL и LRU).
+# Сама версия не кэшируется: каждый get_author читает ее запросом по первичному ключу
+# tableversions (в запросе с ETag - тот же самый), зато кэш не отстает от записи ни в одном воркере
+author_cache = create_cache('authors', settings.AUTHOR_CACHE_TTL, settings.AUTHOR_CACHE_SIZE)
+
 
 class AuthorService:
     def __init__(self, author_repository: AuthorRepository):
@@ -11,12 +22,30 @@ class AuthorService:
         return AuthorFull.model_validate(result)
 
     async def get_author(self, author_id: int = None) -> AuthorFull | list[AuthorFull] | None:
+        version = await TableVersionRepository.get_version('authors')
+        key = f'{version}:{"all" if author_id is None else author_id}'
+        cached = await author_cache.get(key)
+        if cached is not None:
+            if author_id is None:
+                return [AuthorFull.model_validate(author) for author in cached]
+            return AuthorFull.model_validate(cached)
+
         result = await self.repository.get_author(author_id)
         if result is None:
             return None
         if author_id is None:
-            return [AuthorFull.model_validate(author) for author in result]
-        return AuthorFull.model_validate(result)
+            authors = [AuthorFull.model_validate(author) for author in result]
+            await author_cache.set(key, [author.model_dump() for author in authors])
+            return authors
+        author = AuthorFull.model_validate(result)
+        await author_cache.set(key, author.model_dump())
+        return author
+
+    async def search_authors(self, query: str, limit: int, offset: int = 0) -> tuple[list[AuthorFull], int | None]:
+        """Возвращает страницу результатов поиска и смещение следующей страницы (None, если страница последняя)"""
+        result = await self.repository.search_authors(query, limit + 1, offset)
+        items = [AuthorFull.model_validate(item) for item in result[:limit]]
+        return items, offset + limit if len(result) > limit else None
 
     async def update_author(self, author_id: int, data: AuthorFull | AuthorDefault) -> AuthorFull:
         result = await self.repository.update_author(author_id, **data.model_dump())
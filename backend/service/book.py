@@ -18,6 +18,21 @@ class BookService:
             return [BookFull.model_validate(book) for book in result]
         return BookFull.model_validate(result)
 
+    async def get_books_page(self, limit: int, after: int | None = None,
+                             **filters) -> tuple[list[dict], int | None]:
+        """Возвращает страницу книг (строки с полями BookFull) и курсор следующей страницы
+        (None, если страница последняя)"""
+        books = [book async for book in self.repository.stream_books(limit + 1, after, **filters)]
+        if len(books) > limit:
+            return books[:limit], books[limit - 1]['id']
+        return books, None
+
+    async def search_books(self, query: str, limit: int, offset: int = 0) -> tuple[list[BookFull], int | None]:
+        """Возвращает страницу результатов поиска и смещение следующей страницы (None, если страница последняя)"""
+        result = await self.repository.search_books(query, limit + 1, offset)
+        items = [BookFull.model_validate(item) for item in result[:limit]]
+        return items, offset + limit if len(result) > limit else None
+
     async def update_book(self, book_id: int, data: BookFull | BookDefault) -> BookFull:
         result = await self.repository.update_book(book_id, **data.model_dump())
         return BookFull.model_validate(result)
@@ -1,5 +1,5 @@
 from backend.repository.booking import BookingRepository, get_booking_repository
-from backend.schemas.booking import BookingFull, BookingDefault
+from backend.schemas.booking import BookingFull, BookingDefault, BookingCheckoutItem, BookingCheckoutResult
 
 
 class BookingService:
@@ -10,6 +10,18 @@ class BookingService:
         result = await self.repository.create_booking(**data.model_dump())
         return BookingFull.model_validate(result)
 
+    async def checkout_books(self, user_id: int, book_ids: list[int]) -> BookingCheckoutResult:
+        results = await self.repository.checkout_books(user_id, book_ids)
+        items = [
+            BookingCheckoutItem(
+                book_id=book_id,
+                status=status,
+                booking=BookingFull.model_validate(booking) if booking is not None else None
+            )
+            for book_id, status, booking in results
+        ]
+        return BookingCheckoutResult(reserved=sum(item.status == 'reserved' for item in items), items=items)
+
     async def get_booking(self, booking_id: int = None, user_id: int = None) -> BookingFull | list[BookingFull] | None:
         result = await self.repository.get_booking(booking_id, user_id)
         if result is None:
@@ -18,6 +30,9 @@ class BookingService:
             return [BookingFull.model_validate(booking) for booking in result]
         return BookingFull.model_validate(result)
 
+    async def list_bookings(self, user_id: int | None = None) -> list[dict]:
+        return await self.repository.list_bookings(user_id)
+
     async def update_booking(self, booking_id: int, data: BookingFull | BookingDefault) -> BookingFull:
         result = await self.repository.update_booking(booking_id, **data.model_dump())
         return BookingFull.model_validate(result)
@@ -1,4 +1,5 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional
 from backend.repository.chat import ChatRepository, get_chat_repository
 from backend.schemas.chat import (
     ChatRoomCreate, ChatRoomResponse, ChatMessageCreate,
@@ -38,56 +39,24 @@ class ChatService:
         )
         return response
 
-    async def get_user_chats(self, user_id: int) -> List[ChatRoomResponse]:
-        """Получить все чаты пользователя"""
-        rooms = await self.repository.get_user_chat_rooms(user_id)
-
-        result = []
-        for room in rooms:
-            participants = await self.repository.get_room_participants(room.id)
-            unread_count = await self.repository.get_unread_count(user_id, room.id)
-
-            chat_response = ChatRoomResponse(
-                id=room.id,
-                name=room.name,
-                is_group=room.is_group,
-                created_at=room.created_at,
-                participant_count=len(participants)
-            )
-            # Добавим дополнительное поле для непрочитанных сообщений
-            chat_response.__dict__['unread_count'] = unread_count
-            result.append(chat_response)
-
-        return result
-
-    async def get_chat_messages(self, room_id: int, user_id: int, limit: int = 50, offset: int = 0) -> List[
-        ChatMessageResponse]:
-        """Получить сообщения чата"""
+    async def get_user_chats(self, user_id: int) -> List[dict]:
+        """Получить все чаты пользователя (строки с полями ChatRoomResponse)"""
+        return await self.repository.get_user_chat_rooms_summary(user_id)
+
+    async def get_chat_messages(self, room_id: int, user_id: int, limit: int = 50, offset: int = 0,
+                                before_id: Optional[int] = None,
+                                before_ts: Optional[datetime] = None) -> List[dict]:
+        """Получить сообщения чата (строки с полями ChatMessageResponse)"""
         # Проверяем доступ пользователя к чату
-        room = await self.repository.get_chat_room(room_id, user_id)
-        if not room:
+        if not await self.repository.get_membership(room_id, user_id):
             raise ValueError("Chat room not found or access denied")
 
-        messages = await self.repository.get_room_messages(room_id, limit, offset)
+        messages = await self.repository.get_room_messages(room_id, limit, offset, before_id, before_ts)
 
         # Помечаем сообщения как прочитанные
         await self.repository.mark_messages_as_read(room_id, user_id)
 
-        result = []
-        for message in messages:
-            response = ChatMessageResponse(
-                id=message.id,
-                room_id=message.room_id,
-                sender_id=message.sender_id,
-                content=message.content,
-                message_type=message.message_type,
-                created_at=message.created_at,
-                is_read=message.is_read,
-                sender_username=message.sender.username if message.sender else None
-            )
-            result.append(response)
-
-        return result
+        return messages
 
     async def send_message(self, room_id: int, sender_id: int, content: str,
                            message_type: str = "text") -> ChatMessageResponse:
@@ -106,42 +75,24 @@ class ChatService:
         )
         return response
 
-    async def get_room_participants(self, room_id: int, user_id: int) -> List[ChatParticipantResponse]:
-        """Получить участников комнаты"""
-        room = await self.repository.get_chat_room(room_id, user_id)
-        if not room:
+    async def get_room_participants(self, room_id: int, user_id: int) -> List[dict]:
+        """Получить участников комнаты (строки с полями ChatParticipantResponse)"""
+        if not await self.repository.get_membership(room_id, user_id):
             raise ValueError("Chat room not found or access denied")
 
-        participants = await self.repository.get_room_participants(room_id)
-
-        result = []
-        for participant in participants:
-            response = ChatParticipantResponse(
-                id=participant.id,
-                room_id=participant.room_id,
-                user_id=participant.user_id,
-                is_admin=participant.is_admin,
-                joined_at=participant.joined_at,
-                username=participant.user.username,
-                email=participant.user.email
-            )
-            result.append(response)
-
-        return result
+        return await self.repository.get_room_participant_rows(room_id)
 
     async def add_participant_to_group(self, room_id: int, admin_id: int, user_id: int) -> bool:
         """Добавить участника в групповой чат"""
-        room = await self.repository.get_chat_room(room_id, admin_id)
-        if not room:
+        membership = await self.repository.get_membership(room_id, admin_id)
+        if not membership:
             raise ValueError("Chat room not found or access denied")
 
-        if not room.is_group:
+        if not membership["is_group"]:
             raise ValueError("Can only add participants to group chats")
 
         # Проверяем, является ли пользователь администратором
-        participants = await self.repository.get_room_participants(room_id)
-        admin_participant = next((p for p in participants if p.user_id == admin_id and p.is_admin), None)
-        if not admin_participant:
+        if not membership["is_admin"]:
             raise ValueError("Only admins can add participants")
 
         await self.repository.add_participant(room_id, user_id)
@@ -149,16 +100,13 @@ class ChatService:
 
     async def remove_participant(self, room_id: int, admin_id: int, user_id: int) -> bool:
         """Удалить участника из чата"""
-        room = await self.repository.get_chat_room(room_id, admin_id)
-        if not room:
+        membership = await self.repository.get_membership(room_id, admin_id)
+        if not membership:
             raise ValueError("Chat room not found or access denied")
 
         # Проверяем права администратора (для групповых чатов)
-        if room.is_group:
-            participants = await self.repository.get_room_participants(room_id)
-            admin_participant = next((p for p in participants if p.user_id == admin_id and p.is_admin), None)
-            if not admin_participant:
-                raise ValueError("Only admins can remove participants")
+        if membership["is_group"] and not membership["is_admin"]:
+            raise ValueError("Only admins can remove participants")
 
         return await self.repository.remove_participant(room_id, user_id)
 
@@ -166,6 +114,10 @@ class ChatService:
         """Получить количество непрочитанных сообщений"""
         return await self.repository.get_unread_count(user_id, room_id)
 
+    async def get_unread_counts_by_room(self, user_id: int) -> Dict[int, int]:
+        """Получить количество непрочитанных сообщений по комнатам"""
+        return await self.repository.get_unread_counts_by_room(user_id)
+
 
 async def get_chat_service() -> ChatService:
     return ChatService(await get_chat_repository())
@@ -1,6 +1,16 @@
+from backend.cache import create_cache
+from backend.config import settings
 from backend.repository.genre import GenreRepository, get_genre_repository
+from backend.repository.table_version import TableVersionRepository
 from backend.schemas.genre import GenreFull, GenreDefault
 
+# в кэше - словари (model_dump), чтобы его можно было перенести в общее хранилище;
+# ключ - версия таблицы genres (та же, что в ETag) и 'all' для полного списка или id.
+# Любая запись - через сервис, загрузчик фикстур, сырой SQL или в другом воркере - меняет
+# версию, и старые записи больше не читаются (вытесняются по TTL и LRU); версия читается
+# из БД на каждый get_genre - это цена отсутствия устаревших ответов (см. service/author.py)
+genre_cache = create_cache('genres', settings.GENRE_CACHE_TTL, settings.GENRE_CACHE_SIZE)
+
 
 class GenreService:
     def __init__(self, genre_repository: GenreRepository):
@@ -11,12 +21,24 @@ class GenreService:
         return GenreFull.model_validate(result)
 
     async def get_genre(self, genre_id: int = None) -> GenreFull | list[GenreFull] | None:
+        version = await TableVersionRepository.get_version('genres')
+        key = f'{version}:{"all" if genre_id is None else genre_id}'
+        cached = await genre_cache.get(key)
+        if cached is not None:
+            if genre_id is None:
+                return [GenreFull.model_validate(genre) for genre in cached]
+            return GenreFull.model_validate(cached)
+
         result = await self.repository.get_genre(genre_id)
         if result is None:
             return None
         if genre_id is None:
-            return [GenreFull.model_validate(genre) for genre in result]
-        return GenreFull.model_validate(result)
+            genres = [GenreFull.model_validate(genre) for genre in result]
+            await genre_cache.set(key, [genre.model_dump() for genre in genres])
+            return genres
+        genre = GenreFull.model_validate(result)
+        await genre_cache.set(key, genre.model_dump())
+        return genre
 
     async def update_genre(self, genre_id: int, data: GenreFull | GenreDefault) -> GenreFull:
         result = await self.repository.update_genre(genre_id, **data.model_dump())
@@ -0,0 +1,141 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from backend.config import settings
+from backend.repository.chat import ChatRepository
+
+_STOP = object()  # сигнал остановки в очереди: все, что поставлено до него, будет записано
+
+
+class MessageWriter:
+    """Write-behind запись сообщений чата.
+
+    Сообщения со всех сокетов процесса попадают в одну очередь и сохраняются пачками:
+    не реже чем раз в flush_interval секунд или по batch_size сообщений. Вызов submit
+    завершается только после коммита пачки, поэтому рассылка и подтверждение отправителю
+    никогда не опережают запись в БД.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue[Tuple[dict, asyncio.Future]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.messages = 0
+        self.failed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(self._queue))
+
+    async def stop(self):
+        """Остановить запись: текущая пачка и вся очередь дописываются, ожидающие submit получают ответ"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        self._queue.put_nowait(_STOP)
+        await task
+
+    async def submit(self, room_id: int, sender_id: int, content: str, message_type: str = "text") -> dict:
+        """Поставить сообщение в очередь и дождаться его сохранения; возвращает сохраненную строку"""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(({
+            "room_id": room_id,
+            "sender_id": sender_id,
+            "content": content,
+            "message_type": message_type,
+            "is_read": False,  # created_at - default столбца (func.now()), часы БД, как в insert_message
+        }, future))
+        return await future
+
+    async def _run(self, queue: asyncio.Queue):
+        # очередь передается явно: после stop новый start создает свою, а эта дописывается до конца
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # поставленное в очередь после сигнала остановки
+        batch = []
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+            if len(batch) == self.batch_size or queue.empty():
+                await self._flush(batch)
+                batch = []
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        try:
+            rows = await ChatRepository.insert_messages([message for message, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                print(f"Message batch write error, writing row by row: {e}")
+            await self._flush_rows(batch)
+            return
+
+        self.batches += 1
+        # id выдаются в порядке очереди, в том же порядке будят ожидающих
+        for (_, future), row in zip(batch, rows):
+            if row is None:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(ValueError("Sender is not a participant in this chat room"))
+                continue
+            self.messages += 1
+            if not future.done():
+                future.set_result(row)
+
+    async def _flush_rows(self, batch: List[Tuple[dict, asyncio.Future]]):
+        """Пачка не записалась (например, комната удалена или в строке пустое сообщение):
+        пишем по одному сообщению, и ошибку получают только отправители
+        плохих строк. insert_message заново проверяет участие в том же запросе"""
+        for message, future in batch:
+            try:
+                row = await ChatRepository.insert_message(message["room_id"], message["sender_id"],
+                                                          message["content"], message["message_type"])
+                if row is None:
+                    raise ValueError("Sender is not a participant in this chat room")
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.messages += 1
+            if not future.done():
+                future.set_result(row)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "messages": self.messages,
+            "failed": self.failed,
+            "avg_batch": self.messages / self.batches if self.batches else 0.0,
+        }
+
+
+message_writer = MessageWriter(settings.CHAT_WRITE_BATCH_SIZE, settings.CHAT_WRITE_FLUSH_MS / 1000)
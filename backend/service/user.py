@@ -1,7 +1,8 @@
+from backend.database.engine import release_connection
 from backend.repository.user import UserRepository
 from backend.schemas.user import UserRegister, UserUpdate, UserResponse
 from backend.schemas.token import TokenPair
-from backend.security.authorization import get_password_hash, verify_password, create_access_token, create_refresh_token
+from backend.security.authorization import password_hasher, create_access_token, create_refresh_token
 
 
 class UserService:
@@ -13,7 +14,8 @@ class UserService:
             raise ValueError('Passwords do not match')
         if await self.user_repository.get_user_by_email(str(user.email)) is not None:
             raise AttributeError('Email already registered')
-        hashed_password = get_password_hash(user.password)
+        await release_connection()  # соединение не держим занятым, пока считается bcrypt
+        hashed_password = await password_hasher.hash(user.password)
         user = await self.user_repository.register_user(email=user.email, password_hash=hashed_password)
         if user is not None:
             return UserResponse.model_validate(user)
@@ -21,8 +23,15 @@ class UserService:
 
     async def login_user(self, email, password) -> TokenPair:
         email_user = await self.user_repository.get_user_by_email(email)
-        if email_user is None or not verify_password(password, email_user.password_hash):
+        if email_user is None:
             raise AttributeError('Invalid email or password')
+        await release_connection()  # соединение не держим занятым, пока считается bcrypt
+        is_valid, new_hash = await password_hasher.verify_and_update(password, email_user.password_hash)
+        if not is_valid:
+            raise AttributeError('Invalid email or password')
+        if new_hash is not None:
+            # стоимость bcrypt в настройках изменилась - сохраняем пересчитанный хэш
+            await self.user_repository.update_password_by_email(email_user.email, new_hash)
         access_token = create_access_token({"sub": email_user.email})
         if await self.user_repository.user_access(email_user.id):
             return TokenPair.model_validate({
@@ -0,0 +1,19 @@
+"""Тесты на временной SQLite-базе со схемой из миграций (триггеры FTS и версий таблиц - как в работе).
+
+Окружение задается здесь, до первого импорта backend.config: тестовые модули импортируют
+приложение только после этого пакета. Запуск: python -m pytest backend/tests
+(или python -m unittest discover backend/tests -t .).
+"""
+import os
+import tempfile
+
+_database_dir = tempfile.mkdtemp(prefix='books-tests-')
+os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{os.path.join(_database_dir, "test.db")}'
+os.environ['IS_DEBUG'] = '0'
+os.environ['SQL_REQUEST_LOG'] = '0'
+os.environ['BCRYPT_ROUNDS'] = '4'  # быстрые хэши: стоимость bcrypt здесь не проверяется
+
+from alembic import command
+from alembic.config import Config
+
+command.upgrade(Config(os.path.join(os.path.dirname(__file__), '../../alembic.ini')), 'head')
@@ -0,0 +1,68 @@
+import asyncio
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+
+from backend.database.engine import get_async_session
+from backend.database.models import Book, Booking
+from backend.repository.booking import BookingRepository
+from backend.tests.utils import DatabaseTestCase
+
+
+class BookingConcurrencyTest(DatabaseTestCase):
+    """Бронирование условным UPDATE: одна книга - одно бронирование при любой конкуренции"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.users = [await self.create_user(f'reader{i}@example.com') for i in range(5)]
+        self.books = await self.create_books(4)
+
+    async def reserved_by(self) -> dict[int, int | None]:
+        async with get_async_session(False) as session:
+            return dict((await session.execute(select(Book.id, Book.reserved_by))).all())
+
+    async def bookings_per_book(self) -> dict[int, int]:
+        async with get_async_session(False) as session:
+            result = await session.execute(select(Booking.book_id, func.count()).group_by(Booking.book_id))
+            return dict(result.all())
+
+    async def test_concurrent_reservations_book_once(self):
+        book_id = self.books[0].id
+        results = await asyncio.gather(*(
+            BookingRepository.create_booking(user_id=user.id, book_id=book_id) for user in self.users
+        ), return_exceptions=True)
+
+        winners = [result for result in results if isinstance(result, Booking)]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual([str(result) for result in results if not isinstance(result, Booking)],
+                         ['Book is already reserved'] * (len(self.users) - 1))
+        self.assertEqual(await self.bookings_per_book(), {book_id: 1})
+        self.assertEqual((await self.reserved_by())[book_id], winners[0].user_id)
+
+    async def test_overlapping_checkouts_share_no_book(self):
+        first, second, shared, other = (book.id for book in self.books)
+        results = await asyncio.gather(
+            BookingRepository.checkout_books(self.users[0].id, [first, shared]),
+            BookingRepository.checkout_books(self.users[1].id, [shared, second, other]),
+        )
+
+        statuses = [{book_id: status for book_id, status, _ in result} for result in results]
+        self.assertEqual(sorted([statuses[0][shared], statuses[1][shared]]), ['reserved', 'unavailable'])
+        self.assertEqual(await self.bookings_per_book(), {book.id: 1 for book in self.books})
+
+    async def test_failed_checkout_reserves_nothing(self):
+        # вставка бронирования последней книги падает уже после резервирующего UPDATE
+        async with get_async_session() as session:
+            await session.execute(text(
+                f'CREATE TRIGGER fail_booking BEFORE INSERT ON bookings WHEN NEW.book_id = {self.books[-1].id} '
+                "BEGIN SELECT RAISE(ABORT, 'booking rejected'); END"
+            ))
+        try:
+            with self.assertRaises(IntegrityError):
+                await BookingRepository.checkout_books(self.users[0].id, [book.id for book in self.books])
+        finally:
+            async with get_async_session() as session:
+                await session.execute(text('DROP TRIGGER fail_booking'))
+
+        self.assertEqual(set((await self.reserved_by()).values()), {None})
+        self.assertEqual(await self.bookings_per_book(), {})
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from backend.database.engine import get_async_session
+from backend.repository.chat import ChatRepository
+from backend.tests.utils import DatabaseTestCase
+
+
+class RoomHistoryCursorTest(DatabaseTestCase):
+    """Курсор истории на строках одной секунды (SQLite хранит CURRENT_TIMESTAMP без долей секунды)"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        user = await self.create_user()
+        self.room = await ChatRepository.create_chat_room('history', is_group=True)
+        self.user_id = user.id
+
+    async def add_message(self, created_at: str) -> int:
+        # время - строкой в формате хранения, как его записывают func.now() и SQLAlchemy
+        async with get_async_session() as session:
+            result = await session.execute(
+                text("INSERT INTO chatmessages (room_id, sender_id, content, message_type, created_at, is_read) "
+                     "VALUES (:room_id, :sender_id, 'text', 'text', :created_at, 0) RETURNING id"),
+                {'room_id': self.room.id, 'sender_id': self.user_id, 'created_at': created_at}
+            )
+            return result.scalar_one()
+
+    async def page(self, **cursor) -> list[int]:
+        messages = await ChatRepository.get_room_messages(self.room.id, limit=3, **cursor)
+        return [message['id'] for message in messages]
+
+    async def test_before_id_pages_through_same_second(self):
+        ids = [await self.add_message('2026-01-01 10:00:00') for _ in range(6)]
+
+        first = await ChatRepository.get_room_messages(self.room.id, limit=3)
+        self.assertEqual([message['id'] for message in first], ids[:2:-1])
+
+        last = first[-1]
+        self.assertEqual(await self.page(before_id=last['id']), ids[2::-1])
+        # время, которое клиент вернул из ответа, не сбивает курсор
+        self.assertEqual(await self.page(before_id=last['id'], before_ts=last['created_at']), ids[2::-1])
+        self.assertEqual(await self.page(before_id=ids[0]), [])
+
+    async def test_before_ts_matches_both_storage_formats(self):
+        earlier = await self.add_message('2026-01-01 09:59:59.500000')
+        await self.add_message('2026-01-01 10:00:00')
+        await self.add_message('2026-01-01 10:00:00.000000')
+
+        self.assertEqual(await self.page(before_ts=datetime(2026, 1, 1, 10, 0, 0)), [earlier])
+        moscow = timezone(timedelta(hours=3))
+        self.assertEqual(await self.page(before_ts=datetime(2026, 1, 1, 13, 0, 0, tzinfo=moscow)), [earlier])
+        self.assertEqual(len(await self.page(before_ts=datetime(2026, 1, 1, 10, 0, 0, 1))), 3)
@@ -0,0 +1,40 @@
+from sqlalchemy import select
+
+from backend.database.engine import get_async_session
+from backend.database.models import ChatParticipant
+from backend.repository.chat import ChatRepository
+from backend.tests.utils import DatabaseTestCase
+
+
+class ReadCursorTest(DatabaseTestCase):
+    """Новый участник не получает историю комнаты непрочитанной"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.alice = await self.create_user('alice@example.com')
+        self.bob = await self.create_user('bob@example.com')
+        self.room = await ChatRepository.create_chat_room('cursor', is_group=True)
+        await ChatRepository.add_participant(self.room.id, self.alice.id)
+
+    async def participant(self, user_id: int) -> ChatParticipant:
+        async with get_async_session(False) as session:
+            return await session.scalar(select(ChatParticipant).where(
+                ChatParticipant.room_id == self.room.id, ChatParticipant.user_id == user_id
+            ))
+
+    async def test_cursor_starts_at_last_message(self):
+        messages = [await ChatRepository.insert_message(self.room.id, self.alice.id, f'm{i}') for i in range(3)]
+        await ChatRepository.add_participant(self.room.id, self.bob.id)
+
+        bob = await self.participant(self.bob.id)
+        self.assertEqual((bob.last_read_message_id, bob.unread_count), (messages[-1]['id'], 0))
+
+        reply = await ChatRepository.insert_message(self.room.id, self.alice.id, 'после вступления')
+        self.assertEqual(await ChatRepository.get_unread_count(self.bob.id, self.room.id), 1)
+        await ChatRepository.mark_messages_as_read(self.room.id, self.bob.id)
+        bob = await self.participant(self.bob.id)
+        self.assertEqual((bob.last_read_message_id, bob.unread_count), (reply['id'], 0))
+
+    async def test_empty_room_cursor_is_null(self):
+        await ChatRepository.add_participant(self.room.id, self.bob.id)
+        self.assertIsNone((await self.participant(self.bob.id)).last_read_message_id)
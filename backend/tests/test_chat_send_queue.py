@@ -0,0 +1,75 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from fastapi import status
+
+from backend.controllers.chat import ClientConnection
+
+
+class FakeWebSocket:
+    """Клиент, который не читает, пока открыт gate"""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, text: str):
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code: int):
+        self.closed_with = code
+
+
+class SendQueuePolicyTest(IsolatedAsyncioTestCase):
+    """Политики переполнения очереди отправки медленному клиенту"""
+
+    async def connect(self, policy: str, max_queue: int = 3) -> tuple[ClientConnection, FakeWebSocket]:
+        websocket = FakeWebSocket()
+        self.closed = []
+        connection = ClientConnection(websocket, 1, 1, max_queue, policy, self.closed.append)
+        self.addAsyncCleanup(connection.close)
+        connection.enqueue('message', 'first')
+        await asyncio.sleep(0)  # писатель взял первое сообщение и ждет клиента
+        return connection, websocket
+
+    async def drain(self, websocket: FakeWebSocket):
+        websocket.gate.set()
+        await asyncio.sleep(0.01)
+
+    async def test_drop_discards_new_messages(self):
+        connection, websocket = await self.connect('drop')
+        for i in range(5):
+            self.assertTrue(connection.enqueue('message', f'm{i}'))
+
+        self.assertEqual((connection.queue_depth, connection.dropped), (3, 2))
+        await self.drain(websocket)
+        self.assertEqual(websocket.sent, ['first', 'm0', 'm1', 'm2'])
+        self.assertIsNone(websocket.closed_with)
+
+    async def test_coalesce_replaces_pending_typing(self):
+        connection, websocket = await self.connect('coalesce')
+        connection.enqueue('message', 'm0')
+        for i in range(50):
+            connection.enqueue('typing', f'u2-{i}', ('typing', 2))
+            connection.enqueue('typing', f'u3-{i}', ('typing', 3))
+        self.assertEqual((connection.queue_depth, connection.dropped), (3, 0))
+
+        # очередь полна: новое сообщение отбрасывается, typing по-прежнему заменяется на месте
+        connection.enqueue('message', 'm1')
+        connection.enqueue('typing', 'u2-last', ('typing', 2))
+        self.assertEqual(connection.dropped, 1)
+        await self.drain(websocket)
+        self.assertEqual(websocket.sent, ['first', 'm0', 'u2-last', 'u3-49'])
+
+    async def test_disconnect_closes_slow_client(self):
+        connection, websocket = await self.connect('disconnect')
+        results = [connection.enqueue('message', f'm{i}') for i in range(5)]
+
+        self.assertEqual(results, [True, True, True, False, False])
+        await asyncio.sleep(0.01)
+        self.assertEqual(websocket.closed_with, status.WS_1013_TRY_AGAIN_LATER)
+        self.assertTrue(connection.closed)
+        self.assertFalse(connection.enqueue('message', 'after close'))
+        self.assertEqual(self.closed, [connection])
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from backend.backplane import BackplaneBroker, UnixSocketBackplane
+from backend.cache import set_invalidation_publisher
+from backend.repository.chat import ChatRepository, membership_cache
+from backend.tests.utils import DatabaseTestCase
+
+
+class MembershipInvalidationTest(DatabaseTestCase):
+    """Изменения членства сбрасывают кэш не только в своем процессе"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.published = []
+
+        async def publish(cache, keys, prefix):
+            self.published.append((cache, keys, prefix))
+
+        set_invalidation_publisher(publish)
+        self.user = await self.create_user()
+        self.room = await ChatRepository.create_chat_room('cache', is_group=True)
+
+    async def asyncTearDown(self):
+        set_invalidation_publisher(None)
+        await super().asyncTearDown()
+
+    async def test_membership_changes_are_published(self):
+        key = f'{self.room.id}:{self.user.id}'
+        await ChatRepository.add_participant(self.room.id, self.user.id)
+        self.assertIsNotNone(await ChatRepository.get_membership(self.room.id, self.user.id))
+
+        await ChatRepository.remove_participant(self.room.id, self.user.id)
+        self.assertIsNone(await ChatRepository.get_membership(self.room.id, self.user.id))
+        await ChatRepository.delete_chat_room(self.room.id)
+
+        self.assertEqual(self.published, [
+            ('chat_membership', [key], None),
+            ('chat_membership', [key], None),
+            ('chat_membership', [], f'{self.room.id}:'),
+        ])
+
+
+class BackplaneInvalidationTest(IsolatedAsyncioTestCase):
+    """Сброс, разосланный одним воркером через брокер, удаляет запись у всех воркеров"""
+
+    async def asyncSetUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'backplane.sock')
+        self.broker = asyncio.create_task(BackplaneBroker(self.path).serve_forever())
+        self.sender = UnixSocketBackplane(self.path, reconnect_delay=0.01)
+        self.receiver = UnixSocketBackplane(self.path, reconnect_delay=0.01)
+        await self.sender.start()
+        await self.receiver.start()
+        await self.wait_for(lambda: self.sender._writer is not None and self.receiver._writer is not None)
+        await asyncio.sleep(0.05)  # подключившиеся воркеры очищают кэши - кладем записи после этого
+
+    async def asyncTearDown(self):
+        await self.sender.stop()
+        await self.receiver.stop()
+        self.broker.cancel()
+        await membership_cache.clear()
+
+    @staticmethod
+    async def wait_for(condition, timeout: float = 2.0):
+        async with asyncio.timeout(timeout):
+            while not condition():
+                await asyncio.sleep(0.01)
+
+    async def cached(self, key: str) -> bool:
+        return await membership_cache.get(key) is not None
+
+    async def wait_evicted(self, key: str):
+        async with asyncio.timeout(2.0):
+            while await self.cached(key):
+                await asyncio.sleep(0.01)
+
+    async def test_invalidation_reaches_other_workers(self):
+        for key in ('1:2', '1:23', '12:2'):
+            await membership_cache.set(key, {'is_admin': False, 'is_group': True})
+
+        # сам invalidate бэкплейна локальную запись не трогает: ее удаляет кадр, вернувшийся от брокера
+        await self.sender.invalidate('chat_membership', ['1:2'], None)
+        await self.wait_evicted('1:2')
+        self.assertTrue(await self.cached('1:23'))
+
+        await self.sender.invalidate('chat_membership', [], '1:')
+        await self.wait_evicted('1:23')
+        self.assertTrue(await self.cached('12:2'))
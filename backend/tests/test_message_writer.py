@@ -0,0 +1,62 @@
+import asyncio
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.repository.chat import ChatRepository
+from backend.service.message_writer import MessageWriter
+from backend.tests.utils import DatabaseTestCase
+
+
+class MessageWriterTest(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.alice = await self.create_user('alice@example.com')
+        self.bob = await self.create_user('bob@example.com')
+        self.room = await ChatRepository.create_chat_room('writer', is_group=True)
+        await ChatRepository.add_participant(self.room.id, self.alice.id)
+        await ChatRepository.add_participant(self.room.id, self.bob.id)
+        # пачка собирается дольше, чем идет тест: записывают ее stop или batch_size
+        self.writer = MessageWriter(batch_size=100, flush_interval=60)
+
+    async def asyncTearDown(self):
+        await self.writer.stop()
+        await super().asyncTearDown()
+
+    async def test_bad_row_fails_only_its_sender(self):
+        good = asyncio.create_task(self.writer.submit(self.room.id, self.alice.id, 'привет'))
+        removed = asyncio.create_task(self.writer.submit(self.room.id, self.bob.id, 'уже не участник'))
+        broken = asyncio.create_task(self.writer.submit(self.room.id, self.alice.id, None))
+        await asyncio.sleep(0)
+        # участника удалили после проверки членства, но до записи пачки
+        await ChatRepository.remove_participant(self.room.id, self.bob.id)
+        await self.writer.stop()
+
+        self.assertEqual((await good)['content'], 'привет')
+        with self.assertRaises(ValueError):
+            await removed
+        with self.assertRaises(IntegrityError):
+            await broken
+        self.assertEqual(self.writer.messages, 1)
+        self.assertEqual(self.writer.failed, 2)
+
+    async def test_batch_rejects_removed_participant(self):
+        await ChatRepository.remove_participant(self.room.id, self.bob.id)
+        good = asyncio.create_task(self.writer.submit(self.room.id, self.alice.id, 'привет'))
+        removed = asyncio.create_task(self.writer.submit(self.room.id, self.bob.id, 'уже не участник'))
+        await asyncio.sleep(0)
+        await self.writer.stop()
+
+        self.assertEqual((await good)['content'], 'привет')
+        with self.assertRaises(ValueError):
+            await removed
+        # пачка записана целиком, без перехода на построчную запись
+        self.assertEqual((self.writer.batches, self.writer.messages, self.writer.failed), (1, 1, 1))
+
+    async def test_stop_writes_everything_queued(self):
+        tasks = [asyncio.create_task(self.writer.submit(self.room.id, self.alice.id, f'm{i}')) for i in range(30)]
+        await asyncio.sleep(0)
+        await self.writer.stop()
+
+        rows = await asyncio.gather(*tasks)
+        self.assertEqual([row['content'] for row in rows], [f'm{i}' for i in range(30)])
+        self.assertEqual([row['id'] for row in rows], sorted(row['id'] for row in rows))
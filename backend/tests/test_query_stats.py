@@ -0,0 +1,26 @@
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from backend.database.engine import engine
+from backend.query_stats import QueryStats, _query_stats
+from backend.tests.utils import DatabaseTestCase
+
+
+class QueryStatsTest(DatabaseTestCase):
+    async def test_failed_statement_leaves_nothing_on_connection(self):
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        try:
+            async with engine.connect() as connection:
+                info = dict(connection.info)
+                for _ in range(3):
+                    with self.assertRaises(OperationalError):
+                        await connection.execute(text('SELECT * FROM missing_table'))
+                await connection.execute(text('SELECT 1'))
+                # соединение вернется в пул и достанется другому запросу - на нем ничего не копится
+                self.assertEqual(dict(connection.info), info)
+        finally:
+            _query_stats.reset(token)
+
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(stats.slowest_statement, 'SELECT 1')
@@ -0,0 +1,27 @@
+import json
+from datetime import datetime
+from unittest import TestCase
+
+from pydantic import ValidationError
+
+from backend.responses import rows_response
+from backend.schemas.chat import ChatParticipantResponse
+
+
+class RowsResponseTest(TestCase):
+    """rows_response проверяет строки схемой в любом режиме и отдает только ее поля"""
+
+    row = {'id': 1, 'room_id': 2, 'user_id': 3, 'is_admin': False, 'joined_at': datetime(2026, 1, 1, 10, 0),
+           'username': 'reader', 'email': 'reader@example.com'}
+
+    def test_extra_columns_are_not_sent(self):
+        response = rows_response([{**self.row, 'password_hash': 'secret'}], ChatParticipantResponse)
+
+        body = json.loads(response.body)
+        self.assertEqual(response.media_type, 'application/json')
+        self.assertNotIn('password_hash', body[0])
+        self.assertEqual(body, [ChatParticipantResponse(**self.row).model_dump(mode='json')])
+
+    def test_schema_mismatch_is_an_error(self):
+        with self.assertRaises(ValidationError):
+            rows_response([{**self.row, 'user_id': 'not a number'}], ChatParticipantResponse)
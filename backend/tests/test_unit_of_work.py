@@ -0,0 +1,52 @@
+from unittest import mock
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database.engine import get_async_session
+from backend.database.models import Genre
+from backend.tests.utils import DatabaseTestCase
+
+
+class RequestCommitTest(DatabaseTestCase):
+    """Транзакция запроса фиксируется до отправки ответа"""
+
+    async def count_genres(self) -> int:
+        async with get_async_session(False) as session:
+            return await session.scalar(select(func.count()).select_from(Genre))
+
+    async def test_commit_precedes_response(self):
+        from backend.main import app
+
+        events = []
+        commit = AsyncSession.commit
+
+        async def recording_commit(session):
+            events.append('commit')
+            await commit(session)
+
+        async def recording_app(scope, receive, send):
+            async def recording_send(message):
+                if message['type'] == 'http.response.start':
+                    events.append('response')
+                await send(message)
+            await app(scope, receive, recording_send)
+
+        user = await self.create_user()
+        with mock.patch.object(AsyncSession, 'commit', recording_commit):
+            async with self.client(recording_app) as client:
+                response = await client.post('/genres/0', data={'name': 'Роман'}, headers=self.auth_headers(user))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(events, ['commit', 'response'])
+
+    async def test_failed_commit_is_not_reported_as_success(self):
+        user = await self.create_user()
+        error = OperationalError('COMMIT', {}, Exception('database is locked'))
+        with mock.patch.object(AsyncSession, 'commit', side_effect=error):
+            async with self.client() as client:
+                response = await client.post('/genres/0', data={'name': 'Роман'}, headers=self.auth_headers(user))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(await self.count_genres(), 0)
@@ -0,0 +1,57 @@
+from unittest import IsolatedAsyncioTestCase
+
+import httpx
+from sqlalchemy import delete
+
+from backend.cache import caches
+from backend.database.engine import engine, get_async_session
+from backend.database.models import Author, Base, Book, TableVersion, User
+from backend.security.authorization import create_access_token
+
+
+async def clear_database():
+    """Удалить строки всех таблиц (кроме счетчиков версий) и сбросить кэши процесса"""
+    async with get_async_session() as session:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table is not TableVersion.__table__:
+                await session.execute(delete(table))
+    for cache in caches.values():
+        await cache.clear()
+
+
+class DatabaseTestCase(IsolatedAsyncioTestCase):
+    """Тест с чистой базой; соединения пула закрываются после теста - у каждого теста свой event loop"""
+
+    async def asyncSetUp(self):
+        await clear_database()
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+
+    @staticmethod
+    def client(app=None) -> httpx.AsyncClient:
+        if app is None:
+            from backend.main import app
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                                 base_url='http://test')
+
+    @staticmethod
+    async def create_user(email: str = 'reader@example.com', username: str | None = None) -> User:
+        async with get_async_session() as session:
+            user = User(email=email, username=username, password_hash='x')
+            session.add(user)
+        return user
+
+    @staticmethod
+    def auth_headers(user: User) -> dict[str, str]:
+        return {'Authorization': f'Bearer {create_access_token(data={"sub": user.email})}'}
+
+    @staticmethod
+    async def create_books(count: int) -> list[Book]:
+        async with get_async_session() as session:
+            author = Author(first_name='Лев', second_name='Толстой')
+            session.add(author)
+            await session.flush()
+            books = [Book(title=f'Книга {i}', author=author.id) for i in range(count)]
+            session.add_all(books)
+        return books